@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+benchmark_extractor.py
+======================
+Time and memory benchmarks for extract_messenger_personality.py, stage by
+stage, against a synthetic export (generate_fake_export.py) or a real one.
+
+Each stage is run --repeat times and the fastest wall time is kept; one
+extra run under tracemalloc records its peak memory. Results can be saved
+as a baseline and later runs compared against it, so a change that makes
+a stage slower or hungrier shows up before it ships. Compare baselines
+taken on the same machine, with the same export settings.
+
+Stages:
+  discovery   find_message_files()
+  normalise   normalise_text() over every message's raw content
+  normalise_ref
+              the same through the separate multi-pass helpers it replaced
+              (output checked identical); compare the two for the speedup
+  parse       parse_message_file() over every file, serially
+  records     iter_records(): parse + dedupe + aggregate + timestamp sort
+  records_mp  iter_records() with --workers processes (only if --workers > 1)
+  jsonl, csv, sqlite, sqlite_fts, markdown
+              each sink fed the full record stream on its own
+  summaries   Aggregates over the records + style_profiles/global_summary
+  end_to_end  the extractor CLI in a subprocess (wall time only)
+
+Usage:
+    python benchmark_extractor.py
+    python benchmark_extractor.py --messages 500000 --save baseline.json
+    python benchmark_extractor.py --messages 500000 --compare baseline.json
+    python benchmark_extractor.py --export ~/facebook-export --my-name "Your Name"
+
+Options:
+    --export PATH       Benchmark an existing export (folder or .zip) instead
+    --my-name NAME      Subject's sender_name (default: the generator's)
+    --conversations N   Size of the generated export (default: 50)
+    --messages N        Messages in the generated export (default: 50000)
+    --seed N            Generator seed (default: 42)
+    --repeat N          Timed runs per stage (default: 3)
+    --workers N         Also time iter_records with N processes (default: 1)
+    --stages LIST       Comma-separated subset of stages to run
+    --save PATH         Write the results as JSON
+    --compare PATH      Compare with saved results; exit 1 on a regression
+    --tolerance F       Allowed slowdown / memory growth (default: 0.25 = 25%)
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import extract_messenger_personality as emp
+from generate_fake_export import MY_NAME, generate_export
+
+__version__ = "1.0.0"
+
+STAGES = ["discovery", "normalise", "normalise_ref", "parse", "records", "records_mp",
+          "jsonl", "csv", "sqlite", "sqlite_fts", "markdown", "summaries", "end_to_end"]
+# Stages fed the extracted records, which are collected once, untimed.
+RECORD_STAGES = {"jsonl", "csv", "sqlite", "sqlite_fts", "markdown", "summaries"}
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Benchmark the Messenger extractor stage by stage.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    p.add_argument("--export",        default=None, help="Existing export folder or .zip")
+    p.add_argument("--my-name",       default=MY_NAME, help="Subject's sender_name")
+    p.add_argument("--conversations", type=int, default=50,
+                   help="Conversations in the generated export (default: 50)")
+    p.add_argument("--messages",      type=int, default=50_000,
+                   help="Messages in the generated export (default: 50000)")
+    p.add_argument("--seed",          type=int, default=42, help="Generator seed (default: 42)")
+    p.add_argument("--repeat",        type=int, default=3,
+                   help="Timed runs per stage, fastest kept (default: 3)")
+    p.add_argument("--workers",       type=int, default=1,
+                   help="Also time iter_records with N processes (default: 1)")
+    p.add_argument("--stages",        default=",".join(STAGES),
+                   help="Comma-separated stages to run (default: all)")
+    p.add_argument("--save",          default=None, help="Write results as JSON")
+    p.add_argument("--compare",       default=None, help="Baseline JSON to compare against")
+    p.add_argument("--tolerance",     type=float, default=0.25,
+                   help="Allowed slowdown / memory growth (default: 0.25)")
+    p.add_argument("--version",       action="version", version=f"%(prog)s {__version__}")
+    return p.parse_args()
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def measure(run: Callable[[], Optional[int]], repeat: int,
+            memory: bool = True) -> Dict[str, Any]:
+    """
+    Best-of-repeat wall time of run(), plus its tracemalloc peak from one
+    further run. run() returns the number of items it processed (or None).
+    The extractor's own progress output is swallowed.
+    """
+    times: List[float] = []
+    items = None
+    for _ in range(max(1, repeat)):
+        with redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            items   = run()
+            times.append(time.perf_counter() - started)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            with redirect_stdout(io.StringIO()):
+                run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "seconds":     round(best, 4),
+        "runs":        [round(t, 4) for t in times],
+        "items":       items,
+        "items_per_s": round(items / best) if items and best > 0 else None,
+        "peak_mb":     round(peak / 1e6, 2) if peak is not None else None,
+    }
+
+# ---------------------------------------------------------------------------
+# Reference text normalisation  (the per-message path before normalise_text)
+# ---------------------------------------------------------------------------
+
+_MULTISPACE_RE = re.compile(r"\s+")
+_WORD_RE       = re.compile(r"\b\w+\b", re.UNICODE)
+_HIGHBYTE_RE   = re.compile(r"[\x80-\xFF]+")
+
+def _fix_run(m: "re.Match[str]") -> str:
+    try:
+        return m.group().encode("latin-1").decode("utf-8")
+    except (UnicodeDecodeError, UnicodeEncodeError):
+        return m.group()
+
+def reference_normalise(raw: str) -> tuple:
+    content  = _HIGHBYTE_RE.sub(_fix_run, raw) if raw else raw
+    text     = _MULTISPACE_RE.sub(" ", content.replace("\u00a0", " ")).strip()
+    no_urls  = _MULTISPACE_RE.sub(" ", emp.URL_RE.sub("", text)).strip()
+    has_urls = bool(emp.URL_RE.search(text))
+    words    = len(_WORD_RE.findall(text))
+    greek    = len(emp.GREEK_RE.findall(text))
+    latin    = len(emp.LATIN_RE.findall(text))
+    if not text:
+        language = "unknown"
+    elif greek and not latin:
+        language = "greek"
+    elif latin and not greek:
+        language = "english_or_latin"
+    else:
+        language = "mixed" if greek and latin else "unknown"
+    return content, text, no_urls, has_urls, words, language
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+class Bench:
+    """The export under test plus the stage runners, which share its records."""
+
+    def __init__(self, export: Path, my_name: str, workers: int) -> None:
+        self.export  = export
+        self.my_name = my_name
+        self.workers = workers
+        self.scratch = tempfile.TemporaryDirectory(prefix="messenger_bench_")
+        self._records: Optional[List[emp.MessageRecord]] = None
+        self._contents: Optional[List[str]] = None
+
+    def iter_records(self, workers: int = 1) -> Any:
+        return emp.iter_records(
+            inputs              = [self.export],
+            my_name             = self.my_name,
+            include_group_chats = True,
+            min_chars           = 2,
+            workers             = workers,
+            aggregates          = emp.Aggregates(),
+        )
+
+    @property
+    def records(self) -> List[emp.MessageRecord]:
+        if self._records is None:
+            with redirect_stdout(io.StringIO()):
+                self._records = list(self.iter_records())
+        return self._records
+
+    @property
+    def contents(self) -> List[str]:
+        """The raw (mojibake) content string of every message in the export."""
+        if self._contents is None:
+            self._contents = []
+            for source in emp.find_message_files([self.export]):
+                with source.open() as f:
+                    data = json.load(f)
+                self._contents.extend(m.get("content") or "" for m in data.get("messages", [])
+                                      if isinstance(m, dict))
+            for raw in self._contents:
+                if emp.normalise_text(raw) != reference_normalise(raw):
+                    raise AssertionError(f"normalise_text differs from the reference on {raw!r}")
+        return self._contents
+
+    def out(self, name: str) -> Path:
+        path = Path(self.scratch.name) / name
+        path.mkdir(exist_ok=True)
+        return path
+
+    # -- stage runners: each returns the number of items processed ----------
+
+    def discovery(self) -> int:
+        return len(emp.find_message_files([self.export]))
+
+    def normalise(self) -> int:
+        normalise = emp.normalise_text
+        for raw in self.contents:
+            normalise(raw)
+        return len(self.contents)
+
+    def normalise_ref(self) -> int:
+        for raw in self.contents:
+            reference_normalise(raw)
+        return len(self.contents)
+
+    def parse(self) -> int:
+        n = 0
+        for source in emp.find_message_files([self.export]):
+            n += len(emp.parse_message_file(source, self.my_name, True, 2))
+        return n
+
+    def records_serial(self) -> int:
+        return sum(1 for _ in self.iter_records())
+
+    def records_mp(self) -> int:
+        return sum(1 for _ in self.iter_records(self.workers))
+
+    def sink(self, make: Callable[[Path], emp.Sink]) -> Callable[[], int]:
+        def run() -> int:
+            return emp.run_sinks(self.records, [make(self.out("sink"))])
+        return run
+
+    def summaries(self) -> int:
+        aggregates = emp.Aggregates()
+        for rec in self.records:
+            aggregates.add(rec)
+        aggregates.save(self.out("summaries"))
+        return len(self.records)
+
+    def end_to_end(self) -> None:
+        script = Path(emp.__file__).resolve()
+        subprocess.run(
+            [sys.executable, str(script), "--input", str(self.export),
+             "--output", str(self.out("end_to_end")), "--my-name", self.my_name,
+             "--include-group-chats", "--workers", str(self.workers)],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+
+    def runners(self) -> Dict[str, Callable[[], Optional[int]]]:
+        return {
+            "discovery":  self.discovery,
+            "normalise":  self.normalise,
+            "normalise_ref": self.normalise_ref,
+            "parse":      self.parse,
+            "records":    self.records_serial,
+            "records_mp": self.records_mp,
+            "jsonl":      self.sink(lambda d: emp.JsonlSink(d / "messages.jsonl")),
+            "csv":        self.sink(lambda d: emp.CsvSink(d / "messages.csv")),
+            "sqlite":     self.sink(lambda d: emp.SqliteSink(d / "messages.sqlite")),
+            "sqlite_fts": self.sink(lambda d: emp.SqliteSink(d / "messages.sqlite", fts=True)),
+            "markdown":   self.sink(lambda d: emp.MarkdownShardSink(d / "markdown_shards")),
+            "summaries":  self.summaries,
+            "end_to_end": self.end_to_end,
+        }
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f"\n  {'stage':<14} {'best s':>9} {'items/s':>12} {'peak MB':>9}")
+    for name, r in results["stages"].items():
+        rate = f"{r['items_per_s']:>12,}" if r["items_per_s"] else f"{'-':>12}"
+        peak = f"{r['peak_mb']:9.1f}" if r["peak_mb"] is not None else f"{'-':>9}"
+        print(f"  {name:<14} {r['seconds']:9.3f} {rate} {peak}")
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print a comparison table and return the stages that regressed."""
+    if baseline.get("export") != results.get("export"):
+        print("\n  [WARN] Baseline was taken on a different export; "
+              "the comparison is only indicative.")
+    print(f"\n  {'stage':<14} {'base s':>9} {'now s':>9} {'change':>8} "
+          f"{'base MB':>9} {'now MB':>9} {'change':>8}")
+    regressions = []
+    for name, now in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            continue
+        flags = []
+        time_change = now["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+        if time_change > tolerance:
+            flags.append("slower")
+        mem_change = None
+        if now["peak_mb"] is not None and base.get("peak_mb"):
+            mem_change = now["peak_mb"] / base["peak_mb"] - 1
+            if mem_change > tolerance:
+                flags.append("more memory")
+        mem = (f"{base['peak_mb']:9.1f} {now['peak_mb']:9.1f} {mem_change:+8.0%}"
+               if mem_change is not None else f"{'-':>9} {'-':>9} {'-':>8}")
+        print(f"  {name:<14} {base['seconds']:9.3f} {now['seconds']:9.3f} "
+              f"{time_change:+8.0%} {mem}  {' / '.join(flags).upper()}")
+        if flags:
+            regressions.append(name)
+    return regressions
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    args   = parse_args()
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    for name in stages:
+        if name not in STAGES:
+            print(f"[ERROR] Unknown stage {name!r}; choose from {', '.join(STAGES)}",
+                  file=sys.stderr)
+            sys.exit(1)
+    if args.workers <= 1 and "records_mp" in stages:
+        stages.remove("records_mp")
+
+    with tempfile.TemporaryDirectory(prefix="messenger_fake_") as tmp:
+        if args.export:
+            export = Path(args.export).expanduser().resolve()
+            if not export.exists():
+                print(f"[ERROR] Export not found: {export}", file=sys.stderr)
+                sys.exit(1)
+            export_info: Dict[str, Any] = {"path": str(export)}
+        else:
+            export = Path(tmp) / "export"
+            print(f"  Generating {args.messages:,} messages in "
+                  f"{args.conversations:,} conversations…")
+            stats = generate_export(export, conversations=args.conversations,
+                                    messages=args.messages, my_name=args.my_name,
+                                    seed=args.seed)
+            export_info = {"conversations": args.conversations, "messages": args.messages,
+                           "seed": args.seed, "files": stats["files"], "bytes": stats["bytes"]}
+
+        bench   = Bench(export, args.my_name, args.workers)
+        runners = bench.runners()
+        results: Dict[str, Any] = {
+            "version": __version__,
+            "extractor_version": emp.__version__,
+            "python":  sys.version.split()[0],
+            "export":  export_info,
+            "repeat":  args.repeat,
+            "workers": args.workers,
+            "stages":  {},
+        }
+        try:
+            for name in stages:
+                print(f"  {name}…", flush=True)
+                if name in RECORD_STAGES:
+                    bench.records
+                if name.startswith("normalise"):
+                    bench.contents
+                results["stages"][name] = measure(
+                    runners[name], args.repeat,
+                    memory=name not in ("records_mp", "end_to_end"))
+        finally:
+            bench.scratch.cleanup()
+
+    print_results(results)
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n  Results written to {args.save}")
+    if args.compare:
+        baseline    = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n  [REGRESSION] {', '.join(regressions)} "
+                  f"(tolerance {args.tolerance:.0%})", file=sys.stderr)
+            sys.exit(1)
+        print(f"\n  No regressions beyond {args.tolerance:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,23 @@ analysis.
 Outputs (all in --output folder):
   messages.jsonl              — master dataset, one message per line
   messages.csv                — spreadsheet-friendly export
-  messages.sqlite             — fully-indexed SQLite database
+                                (messages.jsonl.gz / messages.csv.gz with --compress,
+                                each with a .blocks.json index of its gzip members)
+  messages.sqlite             — fully-indexed SQLite database, normalised (conversations,
+                                participants, message_data) behind a flat `messages` view
+                                (+ messages_fts with --fts), plus rollup_* tables of
+                                per-conversation day/month/hour/language counts and
+                                reply-latency stats (+ media / media_files with --media)
   style_profiles.json         — per-conversation style summaries (my messages only)
   global_summary.json         — whole-dataset statistics (my messages only)
   markdown_shards/            — messages grouped by conversation + month
+  columns/                    — with --columns: numeric columns as mmap-able .npy files
+                                plus offset-indexed string columns, for analytics
   TRAINING_INSTRUCTIONS.md    — notes for AI/LLM use
+  manifest.json               — size/mtime/sha1 of every source file and the running
+                                aggregates (for --incremental)
+  message_ids.idx             — sorted message_id digests, to dedupe later --incremental
+                                runs (rebuilt from messages.sqlite if missing)
 
 Both sides of each conversation are stored. Use --my-name to distinguish
 your messages (is_me=1) from others (is_me=0).
@@ -28,9 +40,42 @@ Usage:
         --output "./messenger_output" \\
         --my-name "Your Facebook Name"
 
+--input also accepts the .zip file(s) Facebook delivers, read in place:
+    --input facebook-yourname-part1.zip facebook-yourname-part2.zip
+
+Several exports (e.g. requested months apart) can be merged into one
+dataset by listing them all, or later with --incremental: messages they
+share are stored once, and conversation files identical across exports
+are read once.
+
 Optional flags:
     --include-group-chats     include group conversations (excluded by default)
     --min-chars N             minimum cleaned message length to keep (default: 2)
+    --since DATE              only messages from DATE on (YYYY-MM-DD or ISO date-time)
+    --until DATE              only messages before DATE
+    --conversation GLOB       only conversations whose title matches GLOB (repeatable)
+    --participant NAME        only conversations with a matching participant (repeatable)
+    --workers N               parse files in N processes (default: 1, 0 = all CPUs)
+    --incremental             only re-parse files that changed since the last run
+    --sort-memory MB          memory for the timestamp sort before it spills to disk
+                              (default: 256)
+    --temp-dir DIR            where the sort's run files (and the --media
+                              attachment spool) go
+    --fts                     build a full-text index in messages.sqlite
+                              (query it with search_messages.py)
+    --compress                write messages.jsonl.gz / messages.csv.gz instead of
+                              the plain files (multi-member gzip, compressed
+                              in parallel)
+    --columns                 also write columns/, a column store for analytics
+    --media                   resolve every attachment to its file in the export,
+                              sha1 it (in threads) and list it in messages.sqlite;
+                              unchanged files are not re-read on later runs
+    --term-sketch N           count each conversation's terms in a Space-Saving
+                              sketch of N (top_terms counts become upper bounds)
+    --serial-sinks            write the outputs one after another instead of
+                              each in its own thread (same files; always the
+                              case on a single CPU)
+    --profile                 time every stage and write profile.json
 
 How to get your Facebook export:
     Facebook → Settings → Your Facebook information → Download your information
@@ -40,19 +85,37 @@ How to get your Facebook export:
 from __future__ import annotations
 
 import argparse
+import codecs
 import csv
 import hashlib
+import heapq
 import json
+import mimetypes
+import mmap
 import os
+import pickle
+import queue
 import re
 import sqlite3
 import sys
-from collections import Counter, defaultdict
-from dataclasses import dataclass, asdict
-from datetime import datetime, timezone
-from pathlib import Path
-from statistics import mean
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+import tempfile
+import time
+import tracemalloc
+import unicodedata
+import zipfile
+import zlib
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache, partial
+from fnmatch import fnmatch, fnmatchcase
+from itertools import chain, islice
+from operator import attrgetter
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 __version__ = "2.0.0"
 __author__  = "Anastasios Papalias"
@@ -63,8 +126,7 @@ __license__ = "MIT"
 # ---------------------------------------------------------------------------
 
 URL_RE        = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
-MULTISPACE_RE = re.compile(r"\s+")
-WORD_RE       = re.compile(r"\b\w+\b", re.UNICODE)
+WORD_RE       = re.compile(r"\w+")    # same matches as \b\w+\b, half the work
 
 # Greek Unicode ranges
 GREEK_RE = re.compile(r"[\u0370-\u03FF\u1F00-\u1FFF]")
@@ -98,8 +160,15 @@ def fix_fb_encoding(text: str) -> str:
     Uses run-based matching so that ASCII characters (including spaces)
     between garbled sequences don't prevent recovery of surrounding text.
     """
-    if not text:
+    if not text or text.isascii():
         return text
+    # Fast path: the whole string is mojibake (or plain latin-1 that happens
+    # to be valid UTF-8). A UTF-8 sequence never spans an ASCII byte, so
+    # decoding it in one go gives exactly what fixing each run would.
+    try:
+        return text.encode("latin-1").decode("utf-8")
+    except (UnicodeDecodeError, UnicodeEncodeError):
+        pass
 
     def _fix_run(m: re.Match) -> str:
         s = m.group()
@@ -114,8 +183,21 @@ def fix_fb_encoding(text: str) -> str:
 # Data model
 # ---------------------------------------------------------------------------
 
+def slotted(cls: type) -> type:
+    """dataclass(slots=True) for Python < 3.10: the same class, with __slots__ for its fields."""
+    names     = tuple(f.name for f in fields(cls))
+    namespace = {k: v for k, v in vars(cls).items() if k not in ("__dict__", "__weakref__")}
+    namespace["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+@slotted
 @dataclass
 class MessageRecord:
+    """
+    One message. Slotted (no per-instance __dict__) and pickled as a flat
+    tuple of its fields; participants is one list shared by all records
+    of a conversation file, so treat it as read-only.
+    """
     message_id:         str
     conversation_id:    str
     conversation_title: str
@@ -149,6 +231,18 @@ class MessageRecord:
     source_json:        str
     source_folder:      str
 
+    def __reduce__(self) -> Tuple[type, tuple]:
+        return MessageRecord, record_to_tuple(self)
+
+RECORD_FIELDS = [f.name for f in fields(MessageRecord)]
+
+# All fields of a record, in RECORD_FIELDS order, fetched in one C call.
+record_to_tuple = attrgetter(*RECORD_FIELDS)
+
+def record_to_dict(rec: MessageRecord) -> Dict[str, Any]:
+    """Like dataclasses.asdict(), but without deep-copying participants."""
+    return dict(zip(RECORD_FIELDS, record_to_tuple(rec)))
+
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
@@ -159,7 +253,8 @@ def parse_args() -> argparse.Namespace:
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog=__doc__,
     )
-    parser.add_argument("--input",  required=True, help="Root folder of Facebook export")
+    parser.add_argument("--input",  required=True, nargs="+",
+                        help="Root folder of Facebook export, or its .zip file(s)")
     parser.add_argument("--output", required=True, help="Output folder")
     parser.add_argument("--my-name", required=True,
                         help="Your exact Facebook sender_name (as it appears in the export)")
@@ -167,8 +262,120 @@ def parse_args() -> argparse.Namespace:
                         help="Include group chats (default: 1-on-1 only)")
     parser.add_argument("--min-chars", type=int, default=2,
                         help="Minimum cleaned message length to keep (default: 2)")
+    parser.add_argument("--since", type=parse_date_arg, metavar="DATE",
+                        help="Only messages from DATE on (YYYY-MM-DD or ISO date-time, "
+                             "local time)")
+    parser.add_argument("--until", type=parse_date_arg, metavar="DATE",
+                        help="Only messages before DATE")
+    parser.add_argument("--conversation", action="append", default=[], metavar="GLOB",
+                        help="Only conversations whose title matches GLOB "
+                             "(case-insensitive, repeatable)")
+    parser.add_argument("--participant", action="append", default=[], metavar="NAME",
+                        help="Only conversations with a participant matching NAME "
+                             "(glob, case-insensitive, repeatable)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parse files in N processes (default: 1, 0 = all CPUs)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-parse files that changed since the last run "
+                             "(new messages are appended, so messages.jsonl/.csv are "
+                             "no longer globally time-ordered)")
+    parser.add_argument("--sort-memory", type=float, default=SORT_MEMORY_MB, metavar="MB",
+                        help="Memory for sorting records by time before spilling sorted "
+                             f"runs to disk (default: {SORT_MEMORY_MB})")
+    parser.add_argument("--temp-dir", default=None,
+                        help="Folder for the sort's temporary run files and the --media spool "
+                             "(default: the system temp folder)")
+    parser.add_argument("--fts", action="store_true",
+                        help="Build an FTS5 full-text index (messages_fts) in messages.sqlite")
+    parser.add_argument("--compress", action="store_true",
+                        help="Write messages.jsonl.gz / messages.csv.gz (independent gzip "
+                             "blocks, compressed in parallel) instead of the plain files")
+    parser.add_argument("--columns", action="store_true",
+                        help="Also write columns/: numeric columns as .npy files that can be "
+                             "mmap'ed, plus offset-indexed string columns")
+    parser.add_argument("--media", action="store_true",
+                        help="Hash every attachment file of the export into media / media_files "
+                             "tables in messages.sqlite (duplicates share a sha1; files whose "
+                             "size and mtime are unchanged are not re-read)")
+    parser.add_argument("--term-sketch", type=int, default=0, metavar="N",
+                        help="Count each conversation's terms in a Space-Saving sketch of N "
+                             "terms instead of exactly (bounded memory; top_terms counts "
+                             "become upper bounds; default: 0 = exact)")
+    parser.add_argument("--serial-sinks", action="store_true",
+                        help="Write the outputs one after another instead of each in its "
+                             "own thread (same files; always the case on a single CPU)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record wall/CPU time, throughput and peak memory per stage "
+                             "in profile.json (tracemalloc slows the run down)")
     parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.term_sketch < 0:
+        parser.error("--term-sketch must be 0 (exact counts) or more")
+    return args
+
+# ---------------------------------------------------------------------------
+# Export sources  (unpacked folders and .zip archives)
+# ---------------------------------------------------------------------------
+
+MESSAGE_FILE_PATTERN = "message_*.json"
+
+# One ZipFile per (process, archive): members are read through a cached
+# handle, and a forked worker never reuses a handle (and file offset) that
+# it inherited from its parent.
+_open_archives: Dict[Tuple[int, Path], zipfile.ZipFile] = {}
+
+def _archive(path: Path) -> zipfile.ZipFile:
+    key = (os.getpid(), path)
+    zf  = _open_archives.get(key)
+    if zf is None:
+        zf = _open_archives[key] = zipfile.ZipFile(path)
+    return zf
+
+class SourceFile(NamedTuple):
+    """A message_*.json or attachment file; rel is its posix path inside root (a folder or .zip)."""
+    root:    Path
+    rel:     str
+    archive: bool = False
+
+    @property
+    def path(self) -> Path:
+        """Display path; for archives this points *inside* the .zip."""
+        return self.root / self.rel
+
+    def open(self) -> BinaryIO:
+        if self.archive:
+            return _archive(self.root).open(self.rel)
+        return self.path.open("rb")
+
+    def stat(self) -> Tuple[int, int]:
+        """(size, mtime_ns); for archive members, taken from the zip directory."""
+        if self.archive:
+            info = _archive(self.root).getinfo(self.rel)
+            try:
+                mtime = int(datetime(*info.date_time).timestamp())
+            except ValueError:
+                mtime = 0   # zeroed DOS date (1980-00-00), written by some archivers
+            return info.file_size, mtime * 10**9
+        st = self.path.stat()
+        return st.st_size, st.st_mtime_ns
+
+def is_zip_input(path: Path) -> bool:
+    return path.is_file() and zipfile.is_zipfile(path)
+
+def find_message_files(inputs: List[Path]) -> List[SourceFile]:
+    """All message files of every input, in input order and sorted within each."""
+    found: List[SourceFile] = []
+    for root in inputs:
+        if is_zip_input(root):
+            with zipfile.ZipFile(root) as zf:
+                members = [n for n in zf.namelist()
+                           if fnmatch(PurePosixPath(n).name, MESSAGE_FILE_PATTERN)]
+            for name in sorted(members, key=lambda n: PurePosixPath(n).parts):
+                found.append(SourceFile(root, name, archive=True))
+        else:
+            for path in sorted(root.rglob(MESSAGE_FILE_PATTERN)):
+                found.append(SourceFile(root, path.relative_to(root).as_posix()))
+    return found
 
 # ---------------------------------------------------------------------------
 # Utilities
@@ -183,41 +390,45 @@ def safe_slug(text: str, max_len: int = 80) -> str:
     text = re.sub(r"[\s_-]+", "_", text)
     return (text.strip("_") or "untitled")[:max_len]
 
-def read_json_with_fallback(path: Path) -> Optional[dict]:
-    """Try reading the file as utf-8 first, fall back to latin-1."""
-    for enc in ("utf-8", "utf-8-sig", "latin-1"):
-        try:
-            with path.open("r", encoding=enc) as f:
-                return json.load(f)
-        except Exception:
-            continue
-    return None
-
 def normalize_spaces(text: str) -> str:
-    return MULTISPACE_RE.sub(" ", text).strip()
-
-def strip_urls(text: str) -> str:
-    return normalize_spaces(URL_RE.sub("", text))
+    # str.split() and the regex \s agree on what whitespace is (NBSP included).
+    return " ".join(text.split())
 
 def clean_text(text: str) -> str:
-    text = text.replace("\u00a0", " ")
     return normalize_spaces(text)
 
-def detect_language(text: str) -> str:
+def _language(greek: bool, latin: bool) -> str:
+    if greek:
+        return "mixed" if latin else "greek"
+    return "english_or_latin" if latin else "unknown"
+
+def normalise_text(raw: str, terms: bool = False) -> Tuple[str, str, str, bool, int, str]:
+    """
+    Everything parse_message() derives from a message's raw content:
+    (content, text_clean, text_no_urls, has_urls, word_count, language_guess).
+
+    Same results as the separate passes it replaced (kept as
+    benchmark_extractor.reference_normalise), with fewer: ASCII text skips the
+    mojibake repair and the Greek scan, the URL regex only runs when "://"
+    or "." occurs, URL-free text is not re-normalised, and the language
+    scans stop at their first hit. With terms (the subject's messages) the
+    words are counted by tokenise(), which also caches the text's style
+    profile terms.
+    """
+    if not raw:
+        return "", "", "", False, 0, "unknown"
+    ascii_only = raw.isascii()
+    content    = raw if ascii_only else fix_fb_encoding(raw)
+    text       = " ".join(content.split())
     if not text:
-        return "unknown"
-    greek = len(GREEK_RE.findall(text))
-    latin = len(LATIN_RE.findall(text))
-    if greek > 0 and latin == 0:
-        return "greek"
-    if latin > 0 and greek == 0:
-        return "english_or_latin"
-    if greek > 0 and latin > 0:
-        return "mixed"
-    return "unknown"
-
-def count_words(text: str) -> int:
-    return len(WORD_RE.findall(text))
+        return content, "", "", False, 0, "unknown"
+
+    has_urls = ("://" in text or "." in text) and URL_RE.search(text) is not None
+    no_urls  = " ".join(URL_RE.sub("", text).split()) if has_urls else text
+    greek    = not ascii_only and GREEK_RE.search(text) is not None
+    latin    = LATIN_RE.search(text) is not None
+    words    = tokenise(text)[0] if terms else len(WORD_RE.findall(text))
+    return content, text, no_urls, has_urls, words, _language(greek, latin)
 
 def sha1_text(text: str) -> str:
     return hashlib.sha1(text.encode("utf-8", errors="ignore")).hexdigest()
@@ -252,228 +463,2605 @@ def count_field(msg: dict, field: str) -> int:
     v = msg.get(field, [])
     return len(v) if isinstance(v, list) else 0
 
-def progress(current: int, total: int, width: int = 40) -> str:
-    filled = int(width * current / total) if total else 0
+def report_rate(label: str, rows: int, seconds: float) -> None:
+    rate = f"{rows / seconds:,.0f} rows/s" if seconds > 0 else "n/a"
+    print(f"    {label:<20} {rows:>12,} rows  {seconds:8.2f}s  ({rate})")
+
+def format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def progress(current: int, total: int, done_bytes: int = 0, total_bytes: int = 0,
+             elapsed: float = 0.0, width: int = 40) -> str:
+    """Progress bar over bytes parsed (files if sizes are unknown), with an ETA."""
+    done, whole = (done_bytes, total_bytes) if total_bytes else (current, total)
+    filled = int(width * done / whole) if whole else 0
     bar    = "█" * filled + "░" * (width - filled)
-    pct    = 100 * current / total if total else 0
-    return f"\r  [{bar}] {pct:5.1f}%  {current:,}/{total:,} files"
+    pct    = 100 * done / whole if whole else 0
+    line   = f"\r  [{bar}] {pct:5.1f}%  {current:,}/{total:,} files"
+    if total_bytes:
+        line += f"  {done_bytes / 1e6:,.1f}/{total_bytes / 1e6:,.1f} MB"
+    if 0 < done < whole and elapsed > 0:
+        line += f"  ETA {format_duration(elapsed * (whole - done) / done)}"
+    return line + " " * 4
+
+# ---------------------------------------------------------------------------
+# Local calendar  (timestamp_ms -> local date/time fields, cached per day)
+# ---------------------------------------------------------------------------
+
+DAY_SECONDS     = 86_400
+_EPOCH_ORDINAL  = date(1970, 1, 1).toordinal()
+# datetime.fromtimestamp() rounds float seconds to microseconds; inside
+# this range that always lands on the exact millisecond, so the integer
+# arithmetic below agrees with it. Anything outside takes the slow path.
+_CALENDAR_RANGE = range(0, 2**32 * 1000)
+# Preformatted pieces of the ISO string, indexed by minute of day, second
+# and millisecond (datetime.isoformat() omits a zero fraction).
+_CLOCK     = [f"T{h:02d}:{m:02d}:" for h in range(24) for m in range(60)]
+_SECONDS   = [f"{s:02d}" for s in range(60)]
+_FRACTIONS = [""] + [f".{ms:03d}000" for ms in range(1, 1000)]
+
+class LocalCalendar:
+    """
+    Split epoch milliseconds into local (ISO string, year, month, day, hour,
+    minute, weekday name), identical to timestamp_to_dt() + isoformat() +
+    strftime("%A") but without building a tz-aware datetime per message.
+
+    The UTC offset is looked up once per UTC day: if it is the same at both
+    ends of the day it holds all day, otherwise the transition second is
+    found by bisection. Date fields, weekday name and the ISO date are
+    cached per local day, and offset suffixes ("+03:00") per offset.
+    """
+
+    def __init__(self) -> None:
+        self._offsets: Dict[int, Tuple[int, int, int]] = {}
+        self._days: Dict[int, Tuple[str, int, int, int, str]] = {}
+        self._zones: Dict[int, str] = {}
+
+    @staticmethod
+    def _gmtoff(seconds: int) -> int:
+        return time.localtime(seconds).tm_gmtoff
+
+    def _day_offsets(self, utc_day: int) -> Tuple[int, int, int]:
+        """(switch second, offset before it, offset from it on) for one UTC day."""
+        lo = utc_day * DAY_SECONDS
+        hi = lo + DAY_SECONDS - 1
+        before, after = self._gmtoff(lo), self._gmtoff(hi)
+        if before == after:
+            return hi + 1, before, after
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self._gmtoff(mid) == before:
+                lo = mid
+            else:
+                hi = mid
+        return hi, before, after
+
+    def _local_day(self, local_day: int) -> Tuple[str, int, int, int, str]:
+        d = date.fromordinal(_EPOCH_ORDINAL + local_day)
+        fields_ = self._days[local_day] = (d.isoformat(), d.year, d.month, d.day, d.strftime("%A"))
+        return fields_
+
+    def _zone(self, offset: int) -> str:
+        tz   = timezone(timedelta(seconds=offset))
+        zone = self._zones[offset] = datetime(2000, 1, 1, tzinfo=tz).isoformat()[19:]
+        return zone
+
+    def fields(self, timestamp_ms: int) -> Tuple[str, int, int, int, int, int, str]:
+        if timestamp_ms not in _CALENDAR_RANGE:
+            dt = timestamp_to_dt(timestamp_ms)
+            return (dt.isoformat(), dt.year, dt.month, dt.day, dt.hour, dt.minute,
+                    dt.strftime("%A"))
+
+        seconds, millis = divmod(timestamp_ms, 1000)
+        utc_day = seconds // DAY_SECONDS
+        span    = self._offsets.get(utc_day)
+        if span is None:
+            span = self._offsets[utc_day] = self._day_offsets(utc_day)
+        offset = span[1] if seconds < span[0] else span[2]
+
+        local_day, secs = divmod(seconds + offset, DAY_SECONDS)
+        day  = self._days.get(local_day) or self._local_day(local_day)
+        zone = self._zones.get(offset) or self._zone(offset)
+        clock, secs  = divmod(secs, 60)
+        hour, minute = divmod(clock, 60)
+        iso = day[0] + _CLOCK[clock] + _SECONDS[secs] + _FRACTIONS[millis] + zone
+        return iso, day[1], day[2], day[3], hour, minute, day[4]
+
+CALENDAR = LocalCalendar()
+
+# ---------------------------------------------------------------------------
+# Profiling  (--profile)
+# ---------------------------------------------------------------------------
+
+PROFILE_NAME        = "profile.json"
+PROFILE_BATCH_ITEMS = 1_000
+_STAGE_TOTALS       = ("calls", "wall_s", "cpu_s", "items", "bytes")
+
+class Profiler:
+    """
+    Wall time, CPU time, item / byte counts and peak traced memory per
+    pipeline stage, summed over however many calls the stage makes.
+
+    A disabled Profiler (the default) records nothing. Stages that run
+    where files are parsed are recorded by a fresh Profiler (see profiled())
+    and merged into the main one, so with --workers their wall_s is summed
+    over workers. Peak memory comes from tracemalloc and is only taken for
+    calls made with memory=True in a process that is tracing.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled    = enabled
+        self.peak_bytes = 0
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def _stage(self, name: str) -> Dict[str, Any]:
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = dict.fromkeys(_STAGE_TOTALS, 0)
+            st["peak_bytes"] = None
+        return st
+
+    def start(self, memory: bool = False) -> Tuple[float, float]:
+        if memory and tracemalloc.is_tracing():
+            self._note_peak()
+            if hasattr(tracemalloc, "reset_peak"):    # Python 3.9+
+                tracemalloc.reset_peak()
+        return time.perf_counter(), time.process_time()
+
+    def stop(self, name: str, started: Tuple[float, float], items: int = 0,
+             nbytes: int = 0, memory: bool = False) -> None:
+        st = self._stage(name)
+        st["calls"]  += 1
+        st["wall_s"] += time.perf_counter() - started[0]
+        st["cpu_s"]  += time.process_time() - started[1]
+        st["items"]  += items
+        st["bytes"]  += nbytes
+        if memory and tracemalloc.is_tracing():
+            peak = self._note_peak()
+            st["peak_bytes"] = max(peak, st["peak_bytes"] or 0)
+
+    def _note_peak(self) -> int:
+        peak = tracemalloc.get_traced_memory()[1]
+        self.peak_bytes = max(self.peak_bytes, peak)
+        return peak
+
+    @contextmanager
+    def stage(self, name: str, nbytes: int = 0, memory: bool = True) -> Iterator[Dict[str, int]]:
+        """Time the with-block as one call of name; set counts["items"] inside it."""
+        counts = {"items": 0}
+        if not self.enabled:
+            yield counts
+            return
+        started = self.start(memory)
+        try:
+            yield counts
+        finally:
+            self.stop(name, started, counts["items"], nbytes, memory)
+
+    def merge(self, stages: Dict[str, Dict[str, Any]]) -> None:
+        for name, other in stages.items():
+            st = self._stage(name)
+            for key in _STAGE_TOTALS:
+                st[key] += other[key]
+            if other["peak_bytes"] is not None:
+                st["peak_bytes"] = max(other["peak_bytes"], st["peak_bytes"] or 0)
+
+    def report(self, wall_s: float, workers: int) -> Dict[str, Any]:
+        """The profile.json document: run totals plus per-stage totals and rates."""
+        children = os.times()
+        stages = {}
+        for name, st in self.stages.items():
+            wall = st["wall_s"]
+            stages[name] = dict(st,
+                                items_per_s = round(st["items"] / wall) if wall > 0 else None,
+                                mb_per_s    = round(st["bytes"] / wall / 1e6, 2)
+                                              if wall > 0 and st["bytes"] else None)
+        if tracemalloc.is_tracing():
+            self._note_peak()
+        return {
+            "version":           __version__,
+            "python":            sys.version.split()[0],
+            "workers":           workers,
+            "wall_s":            wall_s,
+            "cpu_s":             time.process_time(),
+            "children_cpu_s":    children.children_user + children.children_system,
+            "peak_traced_bytes": self.peak_bytes or None,
+            "stages":            stages,
+        }
+
+def print_profile(report: Dict[str, Any]) -> None:
+    print(f"  Profile ({report['wall_s']:.2f}s wall, {report['cpu_s']:.2f}s CPU"
+          f" + {report['children_cpu_s']:.2f}s in workers):")
+    print(f"    {'stage':<22} {'wall s':>8} {'cpu s':>8} {'items':>12} {'items/s':>10}"
+          f" {'MB/s':>8} {'peak MB':>8}")
+    for name, st in report["stages"].items():
+        peak = f"{st['peak_bytes'] / 1e6:8.1f}" if st["peak_bytes"] is not None else f"{'-':>8}"
+        rate = f"{st['items_per_s']:>10,}" if st["items_per_s"] is not None else f"{'-':>10}"
+        mbps = f"{st['mb_per_s']:8.2f}" if st["mb_per_s"] is not None else f"{'-':>8}"
+        print(f"    {name[:22]:<22} {st['wall_s']:8.2f} {st['cpu_s']:8.2f} {st['items']:>12,}"
+              f" {rate} {mbps} {peak}")
+
+PROFILE = Profiler()
+
+def profiled(parse: Callable[[SourceFile], Any], source: SourceFile) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run parse(source) under a fresh Profiler in whichever process parses the
+    file, and return (result, stage totals). Nested stages (normalise,
+    aggregate) are taken out of "parse", which counts messages and bytes.
+    """
+    global PROFILE
+    outer, PROFILE = PROFILE, Profiler(enabled=True)
+    try:
+        with PROFILE.stage("parse", nbytes=source.stat()[0]):
+            result = parse(source)
+        stages = PROFILE.stages
+    finally:
+        PROFILE = outer
+    total = stages["parse"]
+    for name, st in stages.items():
+        if name != "parse":
+            total["wall_s"] -= st["wall_s"]
+            total["cpu_s"]  -= st["cpu_s"]
+    total["items"] = stages.get("normalise", {}).get("items", 0)
+    return result, stages
+
+# ---------------------------------------------------------------------------
+# Streaming JSON  (a single conversation file can be hundreds of MB)
+# ---------------------------------------------------------------------------
+
+JSON_CHUNK_BYTES = 1 << 20
+_JSON_DECODER    = json.JSONDecoder()
+_JSON_WS_RE      = re.compile(r"[ \t\n\r]*")
+
+def iter_text_chunks(source: SourceFile, encoding: str,
+                     chunk_bytes: int = JSON_CHUNK_BYTES) -> Iterator[str]:
+    """Decode the file chunk by chunk in a single binary read."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with source.open() as f:
+        for raw in iter(lambda: f.read(chunk_bytes), b""):
+            text = decoder.decode(raw)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+class JsonCursor:
+    """Pull-style JSON reader over a stream of text chunks."""
+
+    def __init__(self, chunks: Iterator[str]) -> None:
+        self.chunks = chunks
+        self.buf    = ""
+        self.pos    = 0
+
+    def _fill(self) -> bool:
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, not consumed ('' at end of input)."""
+        while True:
+            self.pos = _JSON_WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"expected one of {chars!r} at offset {self.pos}, got {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal that ends exactly at the buffer edge may
+            # continue in the next chunk — re-read it once more data is in.
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array_items(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+def iter_json_object(chunks: Iterator[str],
+                     stream_keys: Tuple[str, ...] = ("messages",)) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield (key, value) for each member of a top-level JSON object.
+
+    Array values of stream_keys are yielded as lazy iterators over their
+    elements, so only one element is decoded at a time. The caller must
+    consume such an iterator before asking for the next member.
+    """
+    cur = JsonCursor(chunks)
+    cur.expect("{")
+    if cur.peek() == "}":
+        return
+    while True:
+        key = cur.value()
+        cur.expect(":")
+        if key in stream_keys and cur.peek() == "[":
+            items = cur.array_items()
+            yield key, items
+            for _ in items:    # drain whatever the caller did not consume
+                pass
+        else:
+            yield key, cur.value()
+        if cur.expect(",}") == "}":
+            return
+
+# ---------------------------------------------------------------------------
+# Filters  (--since / --until / --conversation / --participant)
+# ---------------------------------------------------------------------------
+
+def parse_date_arg(text: str) -> int:
+    """YYYY-MM-DD or an ISO date-time (local time unless it has an offset) -> epoch ms."""
+    try:
+        return int(datetime.fromisoformat(text).timestamp() * 1000)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO date or date-time: {text!r}")
+
+class RecordFilter(NamedTuple):
+    """
+    Which messages to extract, checked while files are parsed.
+
+    since_ms is inclusive and until_ms exclusive. conversations are globs
+    on the conversation title, participants globs on participant names;
+    both match case-insensitively and are stored casefolded.
+    """
+    since_ms:      Optional[int]   = None
+    until_ms:      Optional[int]   = None
+    conversations: Tuple[str, ...] = ()
+    participants:  Tuple[str, ...] = ()
+
+    @classmethod
+    def create(cls, since_ms: Optional[int] = None, until_ms: Optional[int] = None,
+               conversations: Iterable[str] = (), participants: Iterable[str] = ()) -> "RecordFilter":
+        return cls(since_ms, until_ms, tuple(g.casefold() for g in conversations),
+                   tuple(g.casefold() for g in participants))
+
+    @property
+    def active(self) -> bool:
+        return self != RecordFilter()
+
+    def conversation_verdict(self, header: Dict[str, Any]) -> Optional[bool]:
+        """Whether a file header passes; None while a field the filter needs is missing."""
+        verdict: Optional[bool] = True
+        if self.conversations:
+            if "title" not in header:
+                verdict = None
+            else:
+                title = clean_text(fix_fb_encoding(header["title"])).casefold()
+                if not any(fnmatchcase(title, g) for g in self.conversations):
+                    return False
+        if self.participants:
+            if "participants" not in header:
+                verdict = None
+            else:
+                names = [name.casefold() for name in extract_participants(header)]
+                if not any(fnmatchcase(n, g) for n in names for g in self.participants):
+                    return False
+        return verdict
+
+    def to_json(self) -> Dict[str, Any]:
+        return {k: list(v) if isinstance(v, tuple) else v for k, v in self._asdict().items()}
 
 # ---------------------------------------------------------------------------
 # Core extraction  (v2: stores BOTH sides, is_me properly detected)
 # ---------------------------------------------------------------------------
 
-def extract_records(
-    input_root: Path,
+@lru_cache(maxsize=4096)
+def display_name(raw: str) -> str:
+    """A sender name as exported, decoded and cleaned; one shared str per name."""
+    return clean_text(fix_fb_encoding(raw))
+
+def parse_message(msg: dict, my_name: str, min_chars: int,
+                  source_json: str, source_folder: str) -> Optional[MessageRecord]:
+    """
+    Turn one raw message dict into a record, or None if it is noise.
+
+    Conversation-level fields (id, title, participants, group flag) and the
+    message_id depend on the file header, which Facebook writes *after* the
+    messages array; they are left blank here and filled in by
+    parse_message_file() once the whole file has been read.
+    """
+    sender_raw  = msg.get("sender_name", "")
+    sender_name = display_name(sender_raw)
+
+    # v2: process ALL senders, not just my_name
+    is_me = (sender_name == my_name)
+
+    content, text_clean, text_no_urls, has_urls, word_count, language = \
+        normalise_text(msg.get("content") or "", is_me)
+
+    if text_clean in SKIP_CONTENT_EXACT and looks_like_noise(msg, text_clean):
+        return None
+    if len(text_no_urls) < min_chars and looks_like_noise(msg, text_clean):
+        return None
+
+    timestamp_ms = msg.get("timestamp_ms")
+    if not isinstance(timestamp_ms, int):
+        return None
+
+    timestamp_iso, year, month, day, hour, minute, weekday = CALENDAR.fields(timestamp_ms)
+
+    return MessageRecord(
+        message_id         = "",
+        conversation_id    = "",
+        conversation_title = "",
+        is_group_chat      = False,
+        participants       = [],
+        sender_name        = sender_name,
+        is_me              = is_me,
+        timestamp_iso      = timestamp_iso,
+        timestamp_ms       = timestamp_ms,
+        year               = year,
+        month              = month,
+        day                = day,
+        hour               = hour,
+        minute             = minute,
+        weekday            = weekday,
+        text_original      = content,
+        text_clean         = text_clean,
+        text_no_urls       = text_no_urls,
+        char_count         = len(text_clean),
+        word_count         = word_count,
+        language_guess     = language,
+        has_urls           = has_urls,
+        reaction_count     = len(msg.get("reactions", []))
+                             if isinstance(msg.get("reactions"), list) else 0,
+        photos_count       = count_field(msg, "photos"),
+        videos_count       = count_field(msg, "videos"),
+        audio_count        = count_field(msg, "audio_files"),
+        files_count        = count_field(msg, "files"),
+        gifs_count         = count_field(msg, "gifs"),
+        shares_count       = 1 if msg.get("share") else 0,
+        sticker_present    = bool(msg.get("sticker")),
+        source_json        = source_json,
+        source_folder      = source_folder,
+    )
+
+def _parse_message_stream(
+    source: SourceFile,
+    encoding: str,
+    my_name: str,
+    include_group_chats: bool,
+    min_chars: int,
+    filters: RecordFilter,
+    known_header: Optional[Dict[str, Any]] = None,
+    media: Optional[List[MediaRef]] = None,
+) -> List[MessageRecord]:
+    header: Dict[str, Any]       = dict(known_header or {})
+    records: List[MessageRecord] = []
+    attached: List[Tuple[int, str, str, List[Tuple[str, str]]]] = []
+    source_json   = str(source.path)
+    source_folder = str(source.path.parent)
+    since, until  = filters.since_ms, filters.until_ms
+    by_time       = since is not None or until is not None
+    deferred      = False
+
+    for key, value in iter_json_object(iter_text_chunks(source, encoding)):
+        if key != "messages":
+            header[key] = value
+            continue
+        # Participants usually precede the messages, so for excluded group
+        # chats and participants the rest of the file is not even read. The
+        # title follows them: a title filter passes over the messages
+        # without building records and, if the title matches, the file is
+        # read again below.
+        if "participants" in header and not include_group_chats \
+                and len(extract_participants(header)) > 2:
+            return []
+        verdict = filters.conversation_verdict(header)
+        if verdict is False:
+            return []
+        if verdict is None:
+            deferred = True
+            continue
+        timed    = PROFILE.enabled
+        in_order = True
+        previous = None
+        for msg in value:
+            if isinstance(msg, dict):
+                if by_time:
+                    ts = msg.get("timestamp_ms")
+                    if isinstance(ts, int):
+                        # Facebook lists a file's messages newest first, so
+                        # once one predates --since the rest do too. That is
+                        # only trusted once at least two timestamps have
+                        # shown this file descending; until then, read on.
+                        in_order   = in_order and (previous is None or ts <= previous)
+                        descending = previous is not None and in_order
+                        previous   = ts
+                        if since is not None and ts < since:
+                            if descending:
+                                break
+                            continue
+                        if until is not None and ts >= until:
+                            continue
+                if timed:
+                    started = PROFILE.start()
+                rec = parse_message(msg, my_name, min_chars, source_json, source_folder)
+                if timed:
+                    PROFILE.stop("normalise", started, items=1)
+                if rec is not None:
+                    records.append(rec)
+                if media is not None:
+                    _collect_attachments(msg, rec, attached)
+        if not records and not attached:
+            return []   # nothing to label with the rest of the header
+
+    final = dict(header)
+    final.setdefault("title", source.path.parent.name)
+    final.setdefault("participants", [])
+    if filters.conversation_verdict(final) is False:
+        return []
+    if deferred:
+        return _parse_message_stream(source, encoding, my_name, include_group_chats,
+                                     min_chars, filters, final, media)
+
+    conversation_title = clean_text(
+        fix_fb_encoding(header.get("title", source.path.parent.name))
+    )
+    participants  = extract_participants(header)
+    is_group_chat = len(participants) > 2
+
+    if is_group_chat and not include_group_chats:
+        return []
+
+    conversation_id = conversation_identity(conversation_title, participants)
+    for rec in records:
+        rec.conversation_id    = conversation_id
+        rec.conversation_title = conversation_title
+        rec.is_group_chat      = is_group_chat
+        rec.participants       = participants
+        rec.message_id         = message_identity(
+            conversation_id, rec.timestamp_ms, rec.sender_name, rec.text_clean)
+    if media is not None:
+        for timestamp_ms, sender_name, text, files in attached:
+            message_id = message_identity(conversation_id, timestamp_ms, sender_name, text)
+            media.extend(MediaRef(message_id, uri, kind, conversation_id, sender_name,
+                                  timestamp_ms) for kind, uri in files)
+    return records
+
+def parse_message_file(
+    source: SourceFile,
     my_name: str,
     include_group_chats: bool,
     min_chars: int,
+    filters: Optional[RecordFilter] = None,
+    media: Optional[List[MediaRef]] = None,
 ) -> List[MessageRecord]:
+    """
+    Parse one message_*.json file into records (not yet deduplicated).
+
+    The file is streamed: the messages array is decoded one element at a
+    time and each raw dict is dropped as soon as its record is built.
+    filters are pushed down into the stream: a file stops being read once
+    its header excludes the conversation or, with --since, at the first
+    message that is too old, and skipped messages are never normalised.
+    The encoding is utf-8 (with or without
+    BOM); only if that fails to decode is the file read a second time as
+    latin-1. Unreadable or malformed files yield no records.
+
+    If media is a list, the attachments of the messages read (including
+    media-only messages, which yield no record) are appended to it.
+    """
+    if filters is None:
+        filters = RecordFilter()
+    try:
+        try:
+            return _parse_message_stream(source, "utf-8-sig", my_name,
+                                         include_group_chats, min_chars, filters,
+                                         media=media)
+        except UnicodeDecodeError:
+            return _parse_message_stream(source, "latin-1", my_name,
+                                         include_group_chats, min_chars, filters,
+                                         media=media)
+    except (ValueError, OSError, zipfile.BadZipFile):
+        return []
+
+def parse_and_aggregate(source: SourceFile, term_capacity: int = 0,
+                        **options: Any) -> Tuple[List[MessageRecord], Aggregates]:
+    """parse_message_file() plus the file's Aggregates, built where the file was parsed."""
+    records   = parse_message_file(source, **options)
+    aggregate = Aggregates(term_capacity)
+    with PROFILE.stage("aggregate", memory=False) as counts:
+        for rec in records:
+            aggregate.add(rec)
+        counts["items"] = len(records)
+    return records, aggregate
+
+def parse_with_media(parse: Callable[..., Any], source: SourceFile) -> Tuple[Any, List[MediaRef]]:
+    """parse(source) plus the attachments of the file's messages (--media)."""
+    refs: List[MediaRef] = []
+    return parse(source, media=refs), refs
+
+def resolve_workers(workers: int) -> int:
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+def iter_parsed_files(
+    json_files: List[SourceFile],
+    parse: Callable[[SourceFile], Any],
+    workers: int,
+) -> Iterator[Any]:
+    """
+    Yield parse(f) for every file, always in input order.
 
-    json_files = sorted(input_root.rglob("message_*.json"))
+    With workers > 1 the files are parsed in a process pool (zip members
+    are read by the workers straight from the archive). Only a small
+    window of files is in flight at once, so results never pile up faster
+    than the caller consumes them, and the caller sees exactly the same
+    sequence as in serial mode (same dedupe winners, same tie order).
+    """
+    if workers <= 1:
+        for source in json_files:
+            yield parse(source)
+        return
+
+    files = iter(json_files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(parse, f) for f in islice(files, workers * 4))
+        while pending:
+            result = pending.popleft().result()
+            for f in islice(files, 1):
+                pending.append(pool.submit(parse, f))
+            yield result
+
+def iter_records(
+    inputs: List[Path],
+    my_name: str,
+    include_group_chats: bool,
+    min_chars: int,
+    workers: int = 1,
+    json_files: Optional[List[SourceFile]] = None,
+    aggregates: Optional[Aggregates] = None,
+    sort_memory_mb: Optional[float] = None,
+    temp_dir: Optional[Path] = None,
+    seen: Optional[DedupeIndex] = None,
+    filters: Optional[RecordFilter] = None,
+    media: Optional[MediaSpool] = None,
+) -> Iterator[MessageRecord]:
+    """
+    Yield deduplicated records in timestamp order.
+
+    Files are parsed (optionally in a process pool, see iter_parsed_files)
+    and fed in file order to a RecordSorter, which spills sorted runs to
+    temp_dir once sort_memory_mb (default SORT_MEMORY_MB) is buffered. Peak memory is bounded by the
+    largest single file plus the sort budget, not by the whole export.
+
+    json_files restricts extraction to a subset of the export (--incremental).
+    If aggregates is given, each file's Aggregates are built alongside its
+    parse and merged into it (duplicates are discarded again), so it is
+    complete by the time the first record is yielded.
+
+    Duplicates are found with a DedupeIndex; pass seen to keep it (and
+    have it include earlier digests) after the run. filters (--since,
+    --conversation, …) are applied inside the parse, see parse_message_file.
+    If media is given, the attachments found in the parsed files are
+    added to it (see parse_message_file).
+    """
+    if json_files is None:
+        json_files = find_message_files(inputs)
     total      = len(json_files)
-    records: List[MessageRecord] = []
-    seen_ids: set                = set()
+    seen_ids   = DedupeIndex() if seen is None else seen
+    sorter     = RecordSorter(SORT_MEMORY_MB if sort_memory_mb is None else sort_memory_mb,
+                              temp_dir)
+    options    = dict(my_name=my_name, include_group_chats=include_group_chats,
+                      min_chars=min_chars, filters=filters)
+    parse      = (partial(parse_message_file, **options) if aggregates is None else
+                  partial(parse_and_aggregate, term_capacity=aggregates.term_capacity, **options))
+    if media is not None:
+        parse = partial(parse_with_media, parse)
+    if PROFILE.enabled:
+        parse = partial(profiled, parse)
+    sizes       = [f.stat()[0] for f in json_files]
+    total_bytes = sum(sizes)
+
+    print(f"  Found {total:,} JSON files ({total_bytes / 1e6:,.1f} MB). Extracting…")
+
+    try:
+        started    = time.perf_counter()
+        last_shown = 0.0
+        done_bytes = 0
+        parsed = iter_parsed_files(json_files, parse, resolve_workers(workers))
+        for i, file_records in enumerate(parsed, 1):
+            done_bytes += sizes[i - 1]
+            elapsed     = time.perf_counter() - started
+            if i == total or elapsed - last_shown >= 0.5:
+                print(progress(i, total, done_bytes, total_bytes, elapsed), end="", flush=True)
+                last_shown = elapsed
+            if PROFILE.enabled:
+                file_records, stages = file_records
+                PROFILE.merge(stages)
+            if media is not None:
+                file_records, refs = file_records
+                media.extend(refs)
+            if aggregates is not None:
+                file_records, file_aggregates = file_records
+                aggregates.merge(file_aggregates)
+
+            with PROFILE.stage("dedupe", memory=False) as counts:
+                fresh = []
+                for rec in file_records:
+                    if not seen_ids.add(bytes.fromhex(rec.message_id)):
+                        if aggregates is not None:
+                            aggregates.discard(rec)
+                        continue
+                    fresh.append(rec)
+                counts["items"] = len(file_records)
+            with PROFILE.stage("sort") as counts:
+                sorter.extend(fresh)
+                counts["items"] = len(fresh)
+
+        print()  # newline after progress bar
+        seen_ids = None  # free it before the merge unless the caller holds it
+        if sorter.runs:
+            print(f"  Sorting {sorter.count:,} records from {len(sorter.runs) + bool(sorter.buffer):,} "
+                  f"sorted runs on disk…")
+        if not PROFILE.enabled:
+            yield from sorter.iter_sorted()
+            return
+        merged = sorter.iter_sorted()
+        while True:
+            with PROFILE.stage("sort merge") as counts:
+                batch = list(islice(merged, PROFILE_BATCH_ITEMS))
+                counts["items"] = len(batch)
+            if not batch:
+                return
+            yield from batch
+    finally:
+        sorter.cleanup()
+
+def extract_records(
+    inputs: List[Path],
+    my_name: str,
+    include_group_chats: bool,
+    min_chars: int,
+    workers: int = 1,
+) -> List[MessageRecord]:
+    """Collect iter_records() into a list. Only suitable for small exports."""
+    return list(iter_records(inputs, my_name, include_group_chats, min_chars, workers))
 
-    print(f"  Found {total:,} JSON files. Extracting…")
+# ---------------------------------------------------------------------------
+# Timestamp ordering  (bounded memory)
+# ---------------------------------------------------------------------------
 
-    for i, json_file in enumerate(json_files, 1):
-        if i % 100 == 0 or i == total:
-            print(progress(i, total), end="", flush=True)
+SORT_MEMORY_MB       = 256
+SORT_RECORD_OVERHEAD = 2048   # rough in-memory size of a MessageRecord besides its text
+SORT_MAX_FAN_IN      = 64     # runs merged at once (one open file each)
+SORT_CHUNK_RECORDS   = 256    # records per pickle in a run file
 
-        data = read_json_with_fallback(json_file)
-        if not data:
-            continue
+def _sort_key(rec: MessageRecord) -> int:
+    return rec.timestamp_ms
 
-        conversation_title = clean_text(
-            fix_fb_encoding(data.get("title", json_file.parent.name))
-        )
-        participants  = extract_participants(data)
-        is_group_chat = len(participants) > 2
+def _record_bytes(rec: MessageRecord) -> int:
+    return (SORT_RECORD_OVERHEAD + len(rec.text_original) + len(rec.text_clean)
+            + len(rec.text_no_urls))
 
-        if is_group_chat and not include_group_chats:
-            continue
+class RecordSorter:
+    """
+    Stable external sort of records by timestamp_ms within a memory budget.
+
+    Records are buffered until their estimated size reaches memory_mb, then
+    the buffer is sorted and pickled (in chunks of SORT_CHUNK_RECORDS) to a
+    run file under temp_dir. iter_sorted() k-way merges the runs with
+    heapq.merge, which is stable, so ties keep their extraction order just
+    like an in-memory list.sort(). More than fan_in runs are first merged in
+    passes of fan_in consecutive runs, which bounds open files and read
+    buffers. Exports that fit in a single buffer never touch the disk.
+    """
 
-        conversation_id = conversation_identity(conversation_title, participants)
+    def __init__(self, memory_mb: float = SORT_MEMORY_MB,
+                 temp_dir: Optional[Path] = None,
+                 fan_in: int = SORT_MAX_FAN_IN) -> None:
+        self.memory_bytes = max(1, int(memory_mb * 1024 * 1024))
+        self.temp_dir     = temp_dir
+        self.fan_in       = max(2, fan_in)
+        self.buffer: List[MessageRecord] = []
+        self.buffer_bytes = 0
+        self.runs:   List[Path]          = []
+        self.count   = 0
+        self.passes  = 0
+        self._made   = 0
+        self._tmpdir: Optional[tempfile.TemporaryDirectory] = None
+
+    def add(self, rec: MessageRecord) -> None:
+        self.buffer.append(rec)
+        self.buffer_bytes += _record_bytes(rec)
+        self.count += 1
+        if self.buffer_bytes >= self.memory_bytes:
+            self._spill()
+
+    def extend(self, records: Iterable[MessageRecord]) -> None:
+        for rec in records:
+            self.add(rec)
+
+    def _write_run(self, records: Iterable[MessageRecord]) -> Path:
+        if self._tmpdir is None:
+            self._tmpdir = tempfile.TemporaryDirectory(prefix="messenger_sort_",
+                                                       dir=self.temp_dir)
+        path = Path(self._tmpdir.name) / f"run_{self._made:05d}.pkl"
+        self._made += 1
+        with path.open("wb") as f:
+            it = iter(records)
+            while True:
+                chunk = [record_to_tuple(rec) for rec in islice(it, SORT_CHUNK_RECORDS)]
+                if not chunk:
+                    break
+                pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+        return path
+
+    def _spill(self) -> None:
+        if not self.buffer:
+            return
+        self.buffer.sort(key=_sort_key)
+        self.runs.append(self._write_run(self.buffer))
+        self.buffer = []
+        self.buffer_bytes = 0
+
+    @staticmethod
+    def _read_run(path: Path) -> Iterator[MessageRecord]:
+        with path.open("rb") as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                for values in chunk:
+                    yield MessageRecord(*values)
+
+    def _merge(self, runs: List[Path]) -> Iterator[MessageRecord]:
+        return heapq.merge(*(self._read_run(p) for p in runs), key=_sort_key)
+
+    def iter_sorted(self) -> Iterator[MessageRecord]:
+        if not self.runs:
+            self.buffer.sort(key=_sort_key)
+            yield from self.buffer
+            return
+        self._spill()
+        while len(self.runs) > self.fan_in:
+            merged = []
+            for i in range(0, len(self.runs), self.fan_in):
+                group = self.runs[i:i + self.fan_in]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                merged.append(self._write_run(self._merge(group)))
+                for path in group:
+                    path.unlink()
+            self.runs    = merged
+            self.passes += 1
+        yield from self._merge(self.runs)
+
+    def cleanup(self) -> None:
+        self.buffer = []
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
 
-        for msg in data.get("messages", []):
-            sender_raw  = msg.get("sender_name", "")
-            sender_name = clean_text(fix_fb_encoding(sender_raw))
+# ---------------------------------------------------------------------------
+# Dedupe index  (message_id digests, persisted as message_ids.idx)
+# ---------------------------------------------------------------------------
 
-            # v2: process ALL senders, not just my_name
-            is_me = (sender_name == my_name)
+DEDUPE_INDEX_NAME  = "message_ids.idx"
+DEDUPE_INDEX_MAGIC = b"MSGIDX1\n"
+DEDUPE_BUCKETS     = 1 << 16  # keyed by the first two digest bytes
+DEDUPE_REST        = 18       # digest bytes stored per entry after the key
 
-            content      = fix_fb_encoding(msg.get("content") or "")
-            text_clean   = clean_text(content)
-            text_no_urls = strip_urls(text_clean)
+class DedupeIndex:
+    """
+    Set of 20-byte message_id digests at about 20 bytes per entry (a set of
+    hex strings costs over 100).
+
+    sha1 digests are uniformly spread, so their first two bytes pick one of
+    65,536 buckets and the other 18 bytes are appended to that bucket's
+    bytearray. A lookup is a C-level find() in one small bucket, checked
+    for alignment. save() and load() write and read the buckets as they
+    are (message_ids.idx); from_sqlite() rebuilds them from messages.sqlite.
+    """
 
-            if text_clean in SKIP_CONTENT_EXACT and looks_like_noise(msg, text_clean):
-                continue
-            if len(text_no_urls) < min_chars and looks_like_noise(msg, text_clean):
-                continue
+    def __init__(self) -> None:
+        self.buckets: List[Optional[bytearray]] = [None] * DEDUPE_BUCKETS
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @staticmethod
+    def _find(bucket: bytearray, rest: bytes) -> bool:
+        i = bucket.find(rest)
+        while i >= 0:
+            if i % DEDUPE_REST == 0:
+                return True
+            i = bucket.find(rest, i + 1)
+        return False
+
+    def __contains__(self, digest: bytes) -> bool:
+        bucket = self.buckets[digest[0] << 8 | digest[1]]
+        return bucket is not None and self._find(bucket, digest[2:])
+
+    def add(self, digest: bytes, check: bool = True) -> bool:
+        """Add one digest; True if it was not in the index yet."""
+        key    = digest[0] << 8 | digest[1]
+        bucket = self.buckets[key]
+        rest   = digest[2:]
+        if bucket is None:
+            self.buckets[key] = bytearray(rest)
+        elif check and self._find(bucket, rest):
+            return False
+        else:
+            bucket += rest
+        self.count += 1
+        return True
 
-            timestamp_ms = msg.get("timestamp_ms")
-            if not isinstance(timestamp_ms, int):
-                continue
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            f.write(DEDUPE_INDEX_MAGIC)
+            for key, bucket in enumerate(self.buckets):
+                if bucket:
+                    f.write(key.to_bytes(2, "big") + len(bucket).to_bytes(4, "big"))
+                    f.write(bucket)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["DedupeIndex"]:
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        if not data.startswith(DEDUPE_INDEX_MAGIC):
+            return None
+        index = cls()
+        pos   = len(DEDUPE_INDEX_MAGIC)
+        while pos < len(data):
+            key  = int.from_bytes(data[pos:pos + 2], "big")
+            size = int.from_bytes(data[pos + 2:pos + 6], "big")
+            pos += 6
+            if pos + size > len(data) or size % DEDUPE_REST:
+                return None
+            index.buckets[key] = bytearray(data[pos:pos + size])
+            index.count += size // DEDUPE_REST
+            pos += size
+        return index
+
+    @classmethod
+    def from_sqlite(cls, conn: sqlite3.Connection) -> "DedupeIndex":
+        """Rebuild from message_data, whose message_ids are unique already."""
+        index = cls()
+        for (digest,) in conn.execute("SELECT message_id FROM message_data"):
+            index.add(digest, check=False)
+        return index
+
+def load_dedupe_index(output_root: Path, conn: sqlite3.Connection) -> DedupeIndex:
+    """message_ids.idx if it matches messages.sqlite, otherwise rebuilt from the database."""
+    index = DedupeIndex.load(output_root / DEDUPE_INDEX_NAME)
+    rows  = conn.execute("SELECT count(*) FROM message_data").fetchone()[0]
+    if index is None or len(index) != rows:
+        index = DedupeIndex.from_sqlite(conn)
+    return index
 
-            dt  = timestamp_to_dt(timestamp_ms)
-            mid = message_identity(conversation_id, timestamp_ms, sender_name, text_clean)
+# ---------------------------------------------------------------------------
+# Block-compressed output  (--compress)
+# ---------------------------------------------------------------------------
 
-            if mid in seen_ids:
-                continue
-            seen_ids.add(mid)
-
-            records.append(MessageRecord(
-                message_id         = mid,
-                conversation_id    = conversation_id,
-                conversation_title = conversation_title,
-                is_group_chat      = is_group_chat,
-                participants       = participants,
-                sender_name        = sender_name,
-                is_me              = is_me,
-                timestamp_iso      = dt.isoformat(),
-                timestamp_ms       = timestamp_ms,
-                year               = dt.year,
-                month              = dt.month,
-                day                = dt.day,
-                hour               = dt.hour,
-                minute             = dt.minute,
-                weekday            = dt.strftime("%A"),
-                text_original      = content,
-                text_clean         = text_clean,
-                text_no_urls       = text_no_urls,
-                char_count         = len(text_clean),
-                word_count         = count_words(text_clean),
-                language_guess     = detect_language(text_clean),
-                has_urls           = bool(URL_RE.search(text_clean)),
-                reaction_count     = len(msg.get("reactions", []))
-                                     if isinstance(msg.get("reactions"), list) else 0,
-                photos_count       = count_field(msg, "photos"),
-                videos_count       = count_field(msg, "videos"),
-                audio_count        = count_field(msg, "audio_files"),
-                files_count        = count_field(msg, "files"),
-                gifs_count         = count_field(msg, "gifs"),
-                shares_count       = 1 if msg.get("share") else 0,
-                sticker_present    = bool(msg.get("sticker")),
-                source_json        = str(json_file),
-                source_folder      = str(json_file.parent),
-            ))
-
-    print()  # newline after progress bar
-    records.sort(key=lambda r: r.timestamp_ms)
-    return records
+GZIP_BLOCK_BYTES  = 4 << 20          # uncompressed bytes per gzip member
+GZIP_LEVEL        = 6
+GZIP_INDEX_SUFFIX = ".blocks.json"
+
+def gzip_member(data: bytes, level: int = GZIP_LEVEL) -> bytes:
+    """data as one complete gzip member (mtime 0, so output is reproducible)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+class BlockGzipWriter:
+    """
+    A text file written as a series of independent gzip members, pigz-style.
+
+    Text is collected into blocks of about GZIP_BLOCK_BYTES that end on a
+    write() boundary (the sinks write one record per call). Blocks are
+    compressed in a thread pool (zlib releases the GIL) and written in
+    order, so the file is an ordinary multi-member gzip: zcat, gzip -d and
+    gzip.open() read it straight through.
+
+    <file>.blocks.json lists every member as [compressed offset,
+    uncompressed offset, first record], so a reader can seek to any block
+    and decompress blocks independently, in parallel. Appending adds
+    members and extends the index; an index that does not end where the
+    file does is dropped rather than left wrong.
+    """
+
+    def __init__(self, path: Path, append: bool = False, workers: Optional[int] = None,
+                 level: int = GZIP_LEVEL, block_bytes: int = GZIP_BLOCK_BYTES) -> None:
+        self.path        = path
+        self.index_path  = path.with_name(path.name + GZIP_INDEX_SUFFIX)
+        self.level       = level
+        self.block_bytes = block_bytes
+        self.blocks: Optional[List[List[int]]] = []
+        self.offset = self.text_offset = self.records = 0
+        if append and path.exists():
+            self._load_index(path.stat().st_size)
+        self._f      = path.open("ab" if append else "wb")
+        self._chunks: List[bytes] = []
+        self._size   = 0
+        self._block_records = 0
+        self._workers = workers or os.cpu_count() or 1
+        self._pool    = ThreadPoolExecutor(self._workers, thread_name_prefix="gzip")
+        self._pending: deque = deque()
+
+    def _load_index(self, file_size: int) -> None:
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if index["compressed_bytes"] != file_size:
+                raise ValueError("index does not match file")
+            self.blocks      = index["blocks"]
+            self.offset      = index["compressed_bytes"]
+            self.text_offset = index["uncompressed_bytes"]
+            self.records     = index["records"]
+        except (OSError, ValueError, KeyError):
+            self.blocks = None
+            self.offset = file_size
+
+    def write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self._chunks.append(data)
+        self._size += len(data)
+        self._block_records += 1
+        if self._size >= self.block_bytes:
+            self._submit()
+
+    def _submit(self) -> None:
+        if not self._chunks:
+            return
+        data = b"".join(self._chunks)
+        self._pending.append((self._pool.submit(gzip_member, data, self.level),
+                              len(data), self._block_records))
+        self._chunks, self._size, self._block_records = [], 0, 0
+        while len(self._pending) > 2 * self._workers:
+            self._write_next()
+
+    def _write_next(self) -> None:
+        future, text_bytes, records = self._pending.popleft()
+        member = future.result()
+        self._f.write(member)
+        if self.blocks is not None:
+            self.blocks.append([self.offset, self.text_offset, self.records])
+        self.offset      += len(member)
+        self.text_offset += text_bytes
+        self.records     += records
+
+    def close(self) -> None:
+        try:
+            self._submit()
+            while self._pending:
+                self._write_next()
+        finally:
+            self._pool.shutdown()
+            self._f.close()
+        if self.blocks is None:
+            self.index_path.unlink(missing_ok=True)
+            return
+        index = {"format":             "gzip-members",
+                 "compressed_bytes":   self.offset,
+                 "uncompressed_bytes": self.text_offset,
+                 "records":            self.records,
+                 "blocks":             self.blocks}
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp.write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+def open_text_output(path: Path, append: bool, compress: bool, newline: Optional[str] = None) -> Any:
+    """
+    A text output for one sink: path itself, or a BlockGzipWriter on
+    path.gz with compress. A fresh (non-append) output removes the other
+    variant, so a folder never holds a stale messages.jsonl next to a new
+    messages.jsonl.gz or vice versa.
+    """
+    gz_path = path.with_name(path.name + ".gz")
+    if not append:
+        index_path = gz_path.with_name(gz_path.name + GZIP_INDEX_SUFFIX)
+        for stale in ([path] if compress else [gz_path, index_path]):
+            stale.unlink(missing_ok=True)
+    if compress:
+        return BlockGzipWriter(gz_path, append=append)
+    return path.open("a" if append else "w", newline=newline, encoding="utf-8")
 
 # ---------------------------------------------------------------------------
-# Save outputs
+# Output sinks  (each one consumes the record stream once, in timestamp order)
 # ---------------------------------------------------------------------------
 
-def save_jsonl(records: List[MessageRecord], path: Path) -> None:
-    with path.open("w", encoding="utf-8") as f:
-        for rec in records:
-            f.write(json.dumps(asdict(rec), ensure_ascii=False) + "\n")
+class Sink:
+    """A streaming output: write() is called per record, close() once at the end."""
+
+    name = "sink"
+
+    def write(self, rec: MessageRecord) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class JsonlSink(Sink):
+    name = "messages.jsonl"
+
+    def __init__(self, path: Path, append: bool = False, compress: bool = False) -> None:
+        self.path     = path
+        self.append   = append
+        self.compress = compress
+        self.name     = path.name + (".gz" if compress else "")
+        self._f: Optional[Any] = None
+
+    def write(self, rec: MessageRecord) -> None:
+        if self._f is None:
+            self._f = open_text_output(self.path, self.append, self.compress)
+        self._f.write(json.dumps(record_to_dict(rec), ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+CSV_PARTICIPANTS = RECORD_FIELDS.index("participants")
+
+class CsvSink(Sink):
+    name = "messages.csv"
+
+    def __init__(self, path: Path, append: bool = False, compress: bool = False) -> None:
+        self.path     = path
+        self.append   = append
+        self.compress = compress
+        self.name     = path.name + (".gz" if compress else "")
+        self._f: Optional[Any] = None
+        self._writer: Optional[Any] = None
+
+    def write(self, rec: MessageRecord) -> None:
+        if self._writer is None:
+            target       = self.path.with_name(self.name)
+            has_header   = self.append and target.exists() and target.stat().st_size > 0
+            self._f      = open_text_output(self.path, self.append, self.compress, newline="")
+            self._writer = csv.writer(self._f)
+            if not has_header:
+                self._writer.writerow(RECORD_FIELDS)
+        row = list(record_to_tuple(rec))
+        row[CSV_PARTICIPANTS] = json.dumps(row[CSV_PARTICIPANTS], ensure_ascii=False)
+        self._writer.writerow(row)
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f      = None
+            self._writer = None
+
+SQLITE_BATCH_ROWS = 10_000
+SQLITE_TXN_ROWS   = 250_000
+SQLITE_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -262144",    # KiB, i.e. a 256 MB page cache
+    "PRAGMA temp_store = MEMORY",
+)
+SQLITE_BOOL_COLUMNS = ("is_group_chat", "is_me", "has_urls", "sticker_present")
+
+# Small enumerations stored as integers and expanded again by the view.
+WEEKDAYS       = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday",
+                  "Saturday", "Sunday")
+LANGUAGES      = ("unknown", "greek", "english_or_latin", "mixed")
+WEEKDAY_CODES  = {name: i for i, name in enumerate(WEEKDAYS)}
+LANGUAGE_CODES = {name: i for i, name in enumerate(LANGUAGES)}
+
+# Compact schema. Conversation, sender and source-file strings live once in
+# their own tables; message rows point at them with integer keys. message_id
+# is the raw 20-byte sha1, text_original / text_no_urls are NULL when equal
+# to text_clean, weekday / language are small integers, and timestamp_iso is
+# rebuilt from timestamp_ms plus the UTC offset (seconds) at that instant.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id                INTEGER PRIMARY KEY,
+    conversation_id   TEXT NOT NULL UNIQUE,
+    title             TEXT NOT NULL,
+    is_group_chat     INTEGER NOT NULL,
+    participants_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS conversation_participants (
+    conversation INTEGER NOT NULL REFERENCES conversations(id),
+    participant  INTEGER NOT NULL REFERENCES participants(id),
+    PRIMARY KEY (conversation, participant)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    id            INTEGER PRIMARY KEY,
+    source_json   TEXT NOT NULL UNIQUE,
+    source_folder TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_data (
+    id              INTEGER PRIMARY KEY,
+    message_id      BLOB NOT NULL UNIQUE,
+    conversation    INTEGER NOT NULL REFERENCES conversations(id),
+    sender          INTEGER NOT NULL REFERENCES participants(id),
+    is_me           INTEGER NOT NULL,
+    timestamp_ms    INTEGER NOT NULL,
+    utc_offset      INTEGER NOT NULL,
+    year INTEGER, month INTEGER, day INTEGER,
+    hour INTEGER, minute INTEGER, weekday INTEGER,
+    text_original   TEXT,
+    text_clean      TEXT NOT NULL,
+    text_no_urls    TEXT,
+    char_count INTEGER, word_count INTEGER, language INTEGER,
+    has_urls INTEGER, reaction_count INTEGER,
+    photos_count INTEGER, videos_count INTEGER,
+    audio_count INTEGER, files_count INTEGER,
+    gifs_count INTEGER, shares_count INTEGER,
+    sticker_present INTEGER,
+    source          INTEGER NOT NULL REFERENCES sources(id)
+);
+"""
+MESSAGE_DATA_COLUMNS = (
+    "message_id", "conversation", "sender", "is_me", "timestamp_ms", "utc_offset",
+    "year", "month", "day", "hour", "minute", "weekday",
+    "text_original", "text_clean", "text_no_urls",
+    "char_count", "word_count", "language", "has_urls", "reaction_count",
+    "photos_count", "videos_count", "audio_count", "files_count",
+    "gifs_count", "shares_count", "sticker_present", "source",
+)
+SQLITE_INDEXES = (
+    ("idx_conversation_id",    "message_data(conversation)"),
+    ("idx_timestamp_ms",       "message_data(timestamp_ms)"),
+    ("idx_year",               "message_data(year)"),
+    ("idx_month",              "message_data(month)"),
+    ("idx_language_guess",     "message_data(language)"),
+    ("idx_is_me",              "message_data(is_me)"),
+    ("idx_conversation_title", "conversations(title)"),
+)
+
+def _sql_case(column: str, names: Tuple[str, ...]) -> str:
+    whens = " ".join(f"WHEN {i} THEN '{name}'" for i, name in enumerate(names))
+    return f"CASE {column} {whens} END"
+
+# datetime.isoformat() of the local time: microseconds only when non-zero,
+# and seconds in the UTC offset only when non-zero.
+# SQLite's % truncates towards zero, hence the floored millisecond part.
+_MILLIS_SQL = "((d.timestamp_ms % 1000 + 1000) % 1000)"
+TIMESTAMP_ISO_SQL = f"""(
+    strftime('%Y-%m-%dT%H:%M:%S', (d.timestamp_ms - {_MILLIS_SQL}) / 1000, 'unixepoch',
+             d.utc_offset || ' seconds')
+    || CASE WHEN {_MILLIS_SQL} THEN printf('.%03d000', {_MILLIS_SQL}) ELSE '' END
+    || CASE WHEN d.utc_offset < 0 THEN '-' ELSE '+' END
+    || printf('%02d:%02d', abs(d.utc_offset) / 3600, abs(d.utc_offset) % 3600 / 60)
+    || CASE WHEN abs(d.utc_offset) % 60 THEN printf(':%02d', abs(d.utc_offset) % 60) ELSE '' END
+)"""
+
+# The 32 columns of the original flat messages table, in the same order, so
+# SELECT * FROM messages (and build_training_pairs.py) keep working.
+MESSAGES_SELECT = f"""
+SELECT
+    lower(hex(d.message_id))                AS message_id,
+    c.conversation_id                       AS conversation_id,
+    c.title                                 AS conversation_title,
+    c.is_group_chat                         AS is_group_chat,
+    c.participants_json                     AS participants_json,
+    p.name                                  AS sender_name,
+    d.is_me                                 AS is_me,
+    {TIMESTAMP_ISO_SQL}                     AS timestamp_iso,
+    d.timestamp_ms                          AS timestamp_ms,
+    d.year AS year, d.month AS month, d.day AS day,
+    d.hour AS hour, d.minute AS minute,
+    {_sql_case("d.weekday", WEEKDAYS)}      AS weekday,
+    COALESCE(d.text_original, d.text_clean) AS text_original,
+    d.text_clean                            AS text_clean,
+    COALESCE(d.text_no_urls, d.text_clean)  AS text_no_urls,
+    d.char_count AS char_count, d.word_count AS word_count,
+    {_sql_case("d.language", LANGUAGES)}    AS language_guess,
+    d.has_urls AS has_urls, d.reaction_count AS reaction_count,
+    d.photos_count AS photos_count, d.videos_count AS videos_count,
+    d.audio_count AS audio_count, d.files_count AS files_count,
+    d.gifs_count AS gifs_count, d.shares_count AS shares_count,
+    d.sticker_present AS sticker_present,
+    s.source_json AS source_json, s.source_folder AS source_folder
+FROM message_data d
+JOIN conversations c ON c.id = d.conversation
+JOIN participants  p ON p.id = d.sender
+JOIN sources       s ON s.id = d.source"""
+
+def has_compact_schema(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'message_data'").fetchone() is not None
+
+def compact_database(path: Path) -> bool:
+    """True if path is a messages.sqlite in the current (normalised) layout."""
+    if not path.exists():
+        return False
+    conn = sqlite3.connect(path)
+    try:
+        return has_compact_schema(conn)
+    finally:
+        conn.close()
+
+def record_from_row(row: tuple,
+                    shared: Optional[Dict[str, List[str]]] = None) -> MessageRecord:
+    """
+    Rebuild a record from a row of the messages view (SELECT * / MESSAGES_SELECT).
+
+    shared maps participants_json to the decoded list, so rows of one
+    conversation share a single list (as freshly parsed records do).
+    """
+    rec  = MessageRecord(*row)
+    text = rec.participants or "[]"
+    if shared is None:
+        rec.participants = json.loads(text)
+    else:
+        participants = shared.get(text)
+        if participants is None:
+            participants = shared[text] = json.loads(text)
+        rec.participants = participants
+    for name in SQLITE_BOOL_COLUMNS:
+        setattr(rec, name, bool(getattr(rec, name)))
+    return rec
+
+def utc_offset_seconds(timestamp_iso: str) -> int:
+    offset = datetime.fromisoformat(timestamp_iso).utcoffset()
+    return int(offset.total_seconds()) if offset else 0
+
+class SqliteSink(Sink):
+    """
+    messages.sqlite, bulk-loaded into the compact schema (SQLITE_SCHEMA).
+
+    Rows are buffered SQLITE_BATCH_ROWS at a time for executemany() and
+    committed in explicit transactions of SQLITE_TXN_ROWS, under load-time
+    pragmas (WAL, synchronous=NORMAL, a large page cache). Secondary indexes
+    are built once all rows are in, which is much cheaper than maintaining
+    them row by row. On close the WAL is checkpointed and the database is
+    switched back to a rollback journal, so messages.sqlite is again a single
+    self-contained file. Each phase reports its rows/sec.
+
+    Conversations, participants and source files get integer ids from
+    in-memory maps; their rows are written ahead of the messages that use
+    them. A full run rebuilds messages.sqlite from scratch. With
+    upsert=True the existing database is extended instead: existing
+    message_ids are updated in place, so their rowid (tie order) is kept.
+    With fts=True the messages_fts full-text index is built (or, after an
+    upsert load, extended with the new rows) once the data is in. The
+    rollup tables are then recomputed: all of them, or after an upsert load
+    only those of the conversations it wrote to.
+    """
+
+    name = "messages.sqlite"
+
+    def __init__(self, path: Path, upsert: bool = False, fts: bool = False) -> None:
+        self.path   = path
+        self.upsert = upsert
+        self.fts    = fts
+        self._max_rowid_before = 0
+        self.rows_written = 0
+        self.load_seconds = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows: List[tuple] = []
+        self._txn_rows = 0
+        self._conversations: Dict[str, int] = {}
+        self._participants:  Dict[str, int] = {}
+        self._sources:       Dict[str, int] = {}
+        self._new_conversations: List[tuple] = []
+        self._new_participants:  List[tuple] = []
+        self._new_members:       List[tuple] = []
+        self._new_sources:       List[tuple] = []
+        self._touched: set = set()
+
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = self._open()
+        return self._conn
+
+    def _open(self) -> sqlite3.Connection:
+        if not self.upsert:
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+        # isolation_level=None: transactions are opened and committed explicitly.
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        for pragma in SQLITE_LOAD_PRAGMAS:
+            conn.execute(pragma)
+        conn.executescript(SQLITE_SCHEMA)
+        conn.execute(f"CREATE VIEW IF NOT EXISTS messages AS {MESSAGES_SELECT}")
+
+        self._conversations = dict(conn.execute("SELECT conversation_id, id FROM conversations"))
+        self._participants  = dict(conn.execute("SELECT name, id FROM participants"))
+        self._sources       = dict(conn.execute("SELECT source_json, id FROM sources"))
+        self._max_rowid_before = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM message_data").fetchone()[0]
+        return conn
+
+    def _participant_id(self, name: str) -> int:
+        pid = self._participants.get(name)
+        if pid is None:
+            pid = self._participants[name] = len(self._participants) + 1
+            self._new_participants.append((pid, name))
+        return pid
+
+    def _conversation_id(self, r: MessageRecord) -> int:
+        cid = self._conversations.get(r.conversation_id)
+        if cid is None:
+            cid = self._conversations[r.conversation_id] = len(self._conversations) + 1
+            self._new_conversations.append((
+                cid, r.conversation_id, r.conversation_title, int(r.is_group_chat),
+                json.dumps(r.participants, ensure_ascii=False)))
+            for name in r.participants:
+                self._new_members.append((cid, self._participant_id(name)))
+        self._touched.add(cid)
+        return cid
+
+    def _source_id(self, r: MessageRecord) -> int:
+        sid = self._sources.get(r.source_json)
+        if sid is None:
+            sid = self._sources[r.source_json] = len(self._sources) + 1
+            self._new_sources.append((sid, r.source_json, r.source_folder))
+        return sid
+
+    def _row(self, r: MessageRecord) -> tuple:
+        text = r.text_clean
+        return (bytes.fromhex(r.message_id),
+                self._conversation_id(r), self._participant_id(r.sender_name),
+                int(r.is_me), r.timestamp_ms, utc_offset_seconds(r.timestamp_iso),
+                r.year, r.month, r.day, r.hour, r.minute, WEEKDAY_CODES[r.weekday],
+                None if r.text_original == text else r.text_original,
+                text,
+                None if r.text_no_urls == text else r.text_no_urls,
+                r.char_count, r.word_count, LANGUAGE_CODES[r.language_guess],
+                int(r.has_urls), r.reaction_count,
+                r.photos_count, r.videos_count, r.audio_count,
+                r.files_count, r.gifs_count, r.shares_count,
+                int(r.sticker_present), self._source_id(r))
+
+    def write(self, rec: MessageRecord) -> None:
+        self.connection()
+        self._rows.append(self._row(rec))
+        if len(self._rows) >= SQLITE_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        conn    = self._conn
+        columns = ", ".join(MESSAGE_DATA_COLUMNS)
+        marks   = ",".join("?" * len(MESSAGE_DATA_COLUMNS))
+        if self.upsert:
+            updates = ", ".join(f"{c} = excluded.{c}" for c in MESSAGE_DATA_COLUMNS[1:])
+            sql = (f"INSERT INTO message_data ({columns}) VALUES ({marks}) "
+                   f"ON CONFLICT(message_id) DO UPDATE SET {updates}")
+        else:
+            sql = f"INSERT OR REPLACE INTO message_data ({columns}) VALUES ({marks})"
+
+        started = time.perf_counter()
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.executemany("INSERT INTO participants VALUES (?,?)", self._new_participants)
+        conn.executemany("INSERT INTO conversations VALUES (?,?,?,?,?)", self._new_conversations)
+        conn.executemany("INSERT OR IGNORE INTO conversation_participants VALUES (?,?)",
+                         self._new_members)
+        conn.executemany("INSERT INTO sources VALUES (?,?,?)", self._new_sources)
+        conn.executemany(sql, self._rows)
+        self._new_participants, self._new_conversations = [], []
+        self._new_members, self._new_sources = [], []
+        self._txn_rows    += len(self._rows)
+        self.rows_written += len(self._rows)
+        self._rows = []
+        if self._txn_rows >= SQLITE_TXN_ROWS:
+            conn.execute("COMMIT")
+            self._txn_rows = 0
+        self.load_seconds += time.perf_counter() - started
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        conn = self._conn
+        self._flush()
+        if not self.rows_written:
+            # Nothing loaded, but _open() has still switched to WAL.
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA journal_mode = DELETE")
+            conn.close()
+            self._conn = None
+            return
+        if conn.in_transaction:
+            started = time.perf_counter()
+            conn.execute("COMMIT")
+            self.load_seconds += time.perf_counter() - started
+        report_rate("sqlite insert", self.rows_written, self.load_seconds)
+
+        started = time.perf_counter()
+        for name, target in SQLITE_INDEXES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        total = conn.execute("SELECT COUNT(*) FROM message_data").fetchone()[0]
+        report_rate("sqlite index build", total, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        scope   = self._touched if self.upsert and has_rollups(conn) else None
+        rolled  = refresh_rollups(conn, scope)
+        report_rate("sqlite rollups", rolled, time.perf_counter() - started)
+
+        if self.fts:
+            # Plain INSERT OR REPLACE gives replaced rows new rowids, so only
+            # an upsert load can extend the index instead of rebuilding it.
+            after = self._max_rowid_before if self.upsert and has_fts_index(conn) else 0
+            started = time.perf_counter()
+            conn.execute("BEGIN")
+            indexed = build_fts_index(conn, after)
+            conn.execute("COMMIT")
+            report_rate("sqlite fts index", indexed, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode = DELETE")
+        report_rate("sqlite checkpoint", total, time.perf_counter() - started)
+
+        conn.close()
+        self._conn = None
+
+# ---------------------------------------------------------------------------
+# Rollup tables  (pre-aggregated statistics inside messages.sqlite)
+# ---------------------------------------------------------------------------
 
-def save_csv(records: List[MessageRecord], path: Path) -> None:
-    if not records:
+# Per conversation (conversations.id) and side (is_me), so summaries and
+# dashboards read a few hundred rows instead of scanning message_data.
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_days (
+    conversation INTEGER NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL,
+    day INTEGER NOT NULL, is_me INTEGER NOT NULL,
+    messages INTEGER NOT NULL, words INTEGER NOT NULL, chars INTEGER NOT NULL,
+    PRIMARY KEY (conversation, year, month, day, is_me)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_months (
+    conversation INTEGER NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL,
+    is_me INTEGER NOT NULL,
+    messages INTEGER NOT NULL, words INTEGER NOT NULL, chars INTEGER NOT NULL,
+    PRIMARY KEY (conversation, year, month, is_me)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_hours (
+    conversation INTEGER NOT NULL, is_me INTEGER NOT NULL, hour INTEGER NOT NULL,
+    messages INTEGER NOT NULL,
+    PRIMARY KEY (conversation, is_me, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_languages (
+    conversation INTEGER NOT NULL, is_me INTEGER NOT NULL, language INTEGER NOT NULL,
+    messages INTEGER NOT NULL, words INTEGER NOT NULL,
+    PRIMARY KEY (conversation, is_me, language)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_replies (
+    conversation INTEGER NOT NULL, is_me INTEGER NOT NULL,
+    replies INTEGER NOT NULL, total_ms INTEGER NOT NULL, min_ms INTEGER NOT NULL,
+    median_ms INTEGER NOT NULL, p90_ms INTEGER NOT NULL, max_ms INTEGER NOT NULL,
+    PRIMARY KEY (conversation, is_me)
+) WITHOUT ROWID;
+"""
+# (table, SELECT filling it for the conversations matched by {where}), in order:
+# rollup_months is summed from the fresh rollup_days rows.
+ROLLUP_QUERIES = (
+    ("rollup_days", """
+        SELECT conversation, year, month, day, is_me, count(*), sum(word_count), sum(char_count)
+        FROM message_data WHERE {where} GROUP BY conversation, year, month, day, is_me"""),
+    ("rollup_months", """
+        SELECT conversation, year, month, is_me, sum(messages), sum(words), sum(chars)
+        FROM rollup_days WHERE {where} GROUP BY conversation, year, month, is_me"""),
+    ("rollup_hours", """
+        SELECT conversation, is_me, hour, count(*)
+        FROM message_data WHERE {where} GROUP BY conversation, is_me, hour"""),
+    ("rollup_languages", """
+        SELECT conversation, is_me, language, count(*), sum(word_count)
+        FROM message_data WHERE {where} GROUP BY conversation, is_me, language"""),
+)
+# A message answers the previous one when the other side sent that and it
+# is at most this old; longer silences start a new exchange instead.
+REPLY_MAX_GAP_MS = 12 * 3600 * 1000
+
+def has_rollups(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                        "AND name = 'rollup_replies'").fetchone() is not None
+
+def reply_stats(gaps: List[int]) -> Tuple[int, int, int, int, int, int]:
+    """(replies, total, min, lower median, nearest-rank p90, max) of reply gaps in ms."""
+    gaps.sort()
+    n = len(gaps)
+    return (n, sum(gaps), gaps[0], gaps[(n - 1) // 2], gaps[max(0, -(-9 * n // 10) - 1)],
+            gaps[-1])
+
+def refresh_rollups(conn: sqlite3.Connection,
+                    conversations: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the rollup tables for the given conversation ids, or for all
+    of them. Rows of other conversations are left alone, so an incremental
+    load only pays for the conversations it touched; an updated or
+    back-filled message is handled like a new one. Returns the number of
+    messages aggregated. Runs in its own transaction.
+    """
+    conn.executescript(ROLLUP_SCHEMA)
+    conn.execute("BEGIN")
+    if conversations is None:
+        where = "1"
+    else:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_scope "
+                     "(conversation INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.rollup_scope")
+        conn.executemany("INSERT INTO temp.rollup_scope VALUES (?)",
+                         ((cid,) for cid in conversations))
+        where = "conversation IN (SELECT conversation FROM temp.rollup_scope)"
+
+    for table, select in ROLLUP_QUERIES:
+        conn.execute(f"DELETE FROM {table} WHERE {where}")
+        conn.execute(f"INSERT INTO {table} {select.format(where=where)}")
+
+    gaps: Dict[Tuple[int, int], List[int]] = {}
+    rows = 0
+    previous: Tuple[int, int, int] = (-1, 0, 0)
+    for conv, ts, is_me in conn.execute(
+            f"SELECT conversation, timestamp_ms, is_me FROM message_data WHERE {where} "
+            f"ORDER BY conversation, timestamp_ms, id"):
+        rows += 1
+        prev_conv, prev_ts, prev_me = previous
+        if conv == prev_conv and is_me != prev_me and ts - prev_ts <= REPLY_MAX_GAP_MS:
+            gaps.setdefault((conv, is_me), []).append(ts - prev_ts)
+        previous = (conv, ts, is_me)
+    conn.execute(f"DELETE FROM rollup_replies WHERE {where}")
+    conn.executemany("INSERT INTO rollup_replies VALUES (?,?,?,?,?,?,?,?)",
+                     (key + reply_stats(values) for key, values in sorted(gaps.items())))
+    conn.execute("COMMIT")
+    return rows
+
+# ---------------------------------------------------------------------------
+# Media manifest  (--media: attachment files, hashed into messages.sqlite)
+# ---------------------------------------------------------------------------
+
+# One media row per attachment, keyed by the message_id its message has (or
+# would have: media-only messages are not kept as records, so they have no
+# message_data row) and its uri. The file it resolves to is a media_files
+# row, sha1-hashed, so copies of one photo sent to several conversations
+# share a digest; media_duplicates lists those groups. A file whose size and
+# mtime match its previous row keeps that row's sha1 without being read.
+MEDIA_KINDS        = ("photos", "videos", "audio_files", "files", "gifs")
+MEDIA_HASH_THREADS = 8
+MEDIA_CHUNK_BYTES  = 1 << 20
+MEDIA_SPOOL_REFS   = 65_536   # refs held in memory before MediaSpool spills them
+MEDIA_BATCH_ROWS   = 4096     # media rows inserted, and uris resolved, per batch
+
+MEDIA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_files (
+    id        INTEGER PRIMARY KEY,
+    path      TEXT NOT NULL UNIQUE,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    sha1      BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media (
+    message_id      BLOB NOT NULL,
+    uri             TEXT NOT NULL,
+    kind            TEXT NOT NULL,
+    mime_type       TEXT,
+    conversation_id TEXT NOT NULL,
+    sender_name     TEXT NOT NULL,
+    timestamp_ms    INTEGER NOT NULL,
+    file            INTEGER REFERENCES media_files(id),
+    PRIMARY KEY (message_id, uri)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_media_files_sha1 ON media_files(sha1);
+CREATE INDEX IF NOT EXISTS idx_media_file       ON media(file);
+CREATE INDEX IF NOT EXISTS idx_media_uri        ON media(uri);
+CREATE VIEW IF NOT EXISTS media_duplicates AS
+SELECT lower(hex(sha1))                  AS sha1,
+       MAX(size)                         AS size,
+       COUNT(*)                          AS copies,
+       (COUNT(*) - 1) * MAX(size)        AS redundant_bytes,
+       group_concat(path, char(10))      AS paths
+FROM media_files
+GROUP BY sha1
+HAVING COUNT(*) > 1;
+"""
+
+class MediaRef(NamedTuple):
+    """One attachment of a message, as listed in its message_*.json."""
+    message_id:      str
+    uri:             str
+    kind:            str
+    conversation_id: str
+    sender_name:     str
+    timestamp_ms:    int
+
+def media_attachments(msg: dict) -> List[Tuple[str, str]]:
+    """(kind, uri) of every file attached to a raw message."""
+    found = []
+    for kind in MEDIA_KINDS:
+        items = msg.get(kind)
+        if isinstance(items, list):
+            found.extend((kind, fix_fb_encoding(item["uri"])) for item in items
+                         if isinstance(item, dict) and isinstance(item.get("uri"), str))
+    sticker = msg.get("sticker")
+    if isinstance(sticker, dict) and isinstance(sticker.get("uri"), str):
+        found.append(("sticker", fix_fb_encoding(sticker["uri"])))
+    return found
+
+def _collect_attachments(msg: dict, rec: Optional[MessageRecord],
+                         attached: List[Tuple[int, str, str, List[Tuple[str, str]]]]) -> None:
+    """Note msg's attachments with the fields its message_id is made from."""
+    files = media_attachments(msg)
+    if not files:
         return
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=list(asdict(records[0]).keys()))
-        writer.writeheader()
-        for rec in records:
-            row = asdict(rec)
-            row["participants"] = json.dumps(row["participants"], ensure_ascii=False)
-            writer.writerow(row)
+    if rec is not None:
+        attached.append((rec.timestamp_ms, rec.sender_name, rec.text_clean, files))
+        return
+    timestamp_ms = msg.get("timestamp_ms")
+    if isinstance(timestamp_ms, int):
+        text = normalise_text(msg.get("content") or "")[1]
+        attached.append((timestamp_ms, display_name(msg.get("sender_name", "")), text, files))
+
+class MediaSpool:
+    """
+    The attachments of a run, kept on disk until index_media() reads them.
+
+    Refs are buffered MEDIA_SPOOL_REFS at a time and then pickled to an
+    anonymous temp file under temp_dir, so --media memory does not grow
+    with the number of attachments. Iterating yields them in the order
+    they were added.
+    """
 
-def save_sqlite(records: List[MessageRecord], path: Path) -> None:
+    def __init__(self, temp_dir: Optional[Path] = None) -> None:
+        self.temp_dir = temp_dir
+        self.buffer: List[MediaRef] = []
+        self.count  = 0
+        self._file: Optional[BinaryIO] = None
+
+    def extend(self, refs: Iterable[MediaRef]) -> None:
+        before = len(self.buffer)
+        self.buffer.extend(refs)
+        self.count += len(self.buffer) - before
+        if len(self.buffer) >= MEDIA_SPOOL_REFS:
+            self._spill()
+
+    def _spill(self) -> None:
+        if not self.buffer:
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="messenger_media_", dir=self.temp_dir)
+        pickle.dump([tuple(ref) for ref in self.buffer], self._file, pickle.HIGHEST_PROTOCOL)
+        self.buffer = []
+
+    def __iter__(self) -> Iterator[MediaRef]:
+        if self._file is not None:
+            self._file.seek(0)
+            while True:
+                try:
+                    chunk = pickle.load(self._file)
+                except EOFError:
+                    break
+                for values in chunk:
+                    yield MediaRef(*values)
+        yield from self.buffer
+
+    def close(self) -> None:
+        self.buffer = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+@lru_cache(maxsize=256)
+def _mime_type(suffix: str) -> Optional[str]:
+    return mimetypes.guess_type(f"file{suffix}")[0]
+
+def media_type(uri: str) -> Optional[str]:
+    return _mime_type(PurePosixPath(uri).suffix.lower())
+
+class MediaResolver:
+    """
+    Finds the file of an export that an attachment uri points to.
+
+    uris are relative to the export as Facebook laid it out
+    ("messages/inbox/<conversation>/photos/…"), which need not be how it
+    sits in --input: the message folders may be nested under another
+    folder, --input may be the messages/ folder itself, and a multi-part
+    export spreads its media over several zips. Every input is therefore
+    tried with the folders its message files are nested under, and with
+    the uri's messages/ prefix stripped.
+    """
+
+    def __init__(self, inputs: List[Path], json_files: List[SourceFile]) -> None:
+        self.inputs = inputs
+        prefixes: Dict[str, None] = {}
+        for source in json_files:
+            parts = source.rel.split("/")
+            if "messages" in parts:
+                prefixes["".join(f"{p}/" for p in parts[:parts.index("messages")])] = None
+        prefixes[""] = None
+        self.prefixes = list(prefixes)
+        self._members = {root: set(_archive(root).namelist())
+                         for root in inputs if is_zip_input(root)}
+
+    def candidates(self, uri: str) -> List[str]:
+        parts = uri.lstrip("/").split("/")
+        if ".." in parts:
+            return []
+        tails = ["/".join(parts)]
+        if "messages" in parts:
+            i = parts.index("messages")
+            tails += ["/".join(parts[i:]), "/".join(parts[i + 1:])]
+        return list(dict.fromkeys(prefix + tail for tail in tails for prefix in self.prefixes))
+
+    def resolve(self, uri: str) -> Optional[SourceFile]:
+        if "://" in uri:
+            return None
+        candidates = self.candidates(uri)
+        for root in self.inputs:
+            members = self._members.get(root)
+            for rel in candidates:
+                if members is not None:
+                    if rel in members:
+                        return SourceFile(root, rel, archive=True)
+                elif (root / rel).is_file():
+                    return SourceFile(root, rel)
+        return None
+
+def media_sha1(source: SourceFile) -> Optional[bytes]:
+    """
+    sha1 digest of an attachment, or None if it cannot be read.
+
+    Plain files are mmap'ed and hashed in one call, which releases the GIL
+    for the whole file; zip members are hashed in chunks as they inflate.
+    """
+    h = hashlib.sha1()
+    try:
+        if source.archive:
+            with _archive(source.root).open(source.rel) as f:
+                for chunk in iter(lambda: f.read(MEDIA_CHUNK_BYTES), b""):
+                    h.update(chunk)
+            return h.digest()
+        with source.path.open("rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h.update(mm)
+        return h.digest()
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+
+def load_media_files(path: Path) -> Dict[str, Tuple[int, int, bytes]]:
+    """path → (size, mtime_ns, sha1) of the media_files in an existing messages.sqlite."""
+    if not path.exists():
+        return {}
     conn = sqlite3.connect(path)
-    cur  = conn.cursor()
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS messages (
-        message_id TEXT PRIMARY KEY,
-        conversation_id TEXT, conversation_title TEXT,
-        is_group_chat INTEGER, participants_json TEXT,
-        sender_name TEXT, is_me INTEGER,
-        timestamp_iso TEXT, timestamp_ms INTEGER,
-        year INTEGER, month INTEGER, day INTEGER,
-        hour INTEGER, minute INTEGER, weekday TEXT,
-        text_original TEXT, text_clean TEXT, text_no_urls TEXT,
-        char_count INTEGER, word_count INTEGER, language_guess TEXT,
-        has_urls INTEGER, reaction_count INTEGER,
-        photos_count INTEGER, videos_count INTEGER,
-        audio_count INTEGER, files_count INTEGER,
-        gifs_count INTEGER, shares_count INTEGER,
-        sticker_present INTEGER, source_json TEXT, source_folder TEXT
+    try:
+        return {p: (size, mtime, digest) for p, size, mtime, digest in
+                conn.execute("SELECT path, size, mtime_ns, sha1 FROM media_files")}
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+def index_media(
+    db_path: Path,
+    refs: Iterable[MediaRef],
+    inputs: List[Path],
+    json_files: List[SourceFile],
+    known: Optional[Dict[str, Tuple[int, int, bytes]]] = None,
+    threads: int = MEDIA_HASH_THREADS,
+) -> int:
+    """
+    Add refs to the media tables of messages.sqlite; returns the files hashed.
+
+    refs (typically a MediaSpool) are inserted MEDIA_BATCH_ROWS at a time
+    with file = NULL, then the distinct uris still without a file are read
+    back in batches of the same size. Each is resolved once (MediaResolver)
+    and fingerprinted like message files in scan_sources: size and mtime
+    are compared with known (the media_files of a database a full run
+    replaced) and the database's own media_files rows, and only new or
+    changed files are hashed, in `threads` threads. Attachments that cannot
+    be found or read keep file = NULL.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.executescript(MEDIA_SCHEMA)
+        known = dict(known or {})
+        known.update((p, (size, mtime, digest)) for p, size, mtime, digest in
+                     conn.execute("SELECT path, size, mtime_ns, sha1 FROM media_files"))
+
+        refs = iter(refs)
+        conn.execute("BEGIN")
+        for batch in iter(lambda: list(islice(refs, MEDIA_BATCH_ROWS)), []):
+            conn.executemany(
+                "INSERT OR REPLACE INTO media VALUES (?,?,?,?,?,?,?,NULL)",
+                [(bytes.fromhex(r.message_id), r.uri, r.kind, media_type(r.uri),
+                  r.conversation_id, r.sender_name, r.timestamp_ms) for r in batch])
+        conn.execute("COMMIT")
+
+        resolver = MediaResolver(inputs, json_files)
+        hashed   = 0
+        last_uri = ""
+        started  = time.perf_counter()
+        with ThreadPoolExecutor(max(1, threads)) as pool:
+            while True:
+                uris = [uri for (uri,) in conn.execute(
+                    "SELECT DISTINCT uri FROM media WHERE file IS NULL AND uri > ? "
+                    "ORDER BY uri LIMIT ?", (last_uri, MEDIA_BATCH_ROWS))]
+                if not uris:
+                    break
+                last_uri = uris[-1]
+
+                located: Dict[str, str]        = {}
+                files:   Dict[str, SourceFile] = {}
+                for uri in uris:
+                    source = resolver.resolve(uri)
+                    if source is not None:
+                        located[uri] = str(source.path)
+                        files[str(source.path)] = source
+
+                entries: Dict[str, Tuple[int, int, bytes]] = {}
+                to_hash: List[Tuple[str, SourceFile, int, int]] = []
+                for key, source in files.items():
+                    try:
+                        size, mtime = source.stat()
+                    except (OSError, KeyError):
+                        continue
+                    prev = known.get(key)
+                    if prev and prev[0] == size and prev[1] == mtime:
+                        entries[key] = prev
+                    else:
+                        to_hash.append((key, source, size, mtime))
+                digests = pool.map(media_sha1, [source for _, source, *_ in to_hash])
+                for (key, source, size, mtime), digest in zip(to_hash, digests):
+                    if digest is not None:
+                        entries[key] = known[key] = (size, mtime, digest)
+                hashed += len(to_hash)
+
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO media_files (path, size, mtime_ns, sha1) VALUES (?,?,?,?) "
+                    "ON CONFLICT(path) DO UPDATE SET size = excluded.size, "
+                    "mtime_ns = excluded.mtime_ns, sha1 = excluded.sha1",
+                    [(key, size, mtime, digest) for key, (size, mtime, digest) in entries.items()])
+                conn.executemany(
+                    "UPDATE media SET file = (SELECT id FROM media_files WHERE path = ?) "
+                    "WHERE uri = ? AND file IS NULL",
+                    [(key, uri) for uri, key in located.items() if key in entries])
+                conn.execute("COMMIT")
+        report_rate("media hash", hashed, time.perf_counter() - started)
+
+        attachments, missing = conn.execute(
+            "SELECT COUNT(*), COUNT(*) - COUNT(file) FROM media").fetchone()
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM media_files").fetchone()
+        groups, redundant = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(redundant_bytes), 0) FROM media_duplicates").fetchone()
+    finally:
+        conn.close()
+    print(f"  Media: {attachments:,} attachments, {count:,} files ({size / 1e6:,.1f} MB, "
+          f"{hashed:,} hashed), {missing:,} not in the export; "
+          f"{groups:,} duplicated ({redundant / 1e6:,.1f} MB redundant)")
+    return hashed
+
+# ---------------------------------------------------------------------------
+# Full-text search  (optional FTS5 index inside messages.sqlite)
+# ---------------------------------------------------------------------------
+
+# SQLite's unicode61 tokenizer folds case but keeps Greek accents (καφέ does
+# not match καφε) and treats final sigma as its own letter. Text is therefore
+# folded in Python before it is indexed, and queries are folded the same way.
+# The FTS table is contentless: it stores only the index, keyed by
+# message_data.id, and hits are joined back to the message rows for display.
+FTS_TABLE     = "messages_fts"
+_COMBINING_RE = re.compile(r"[\u0300-\u036f]")
+_FINAL_SIGMA  = str.maketrans({"ς": "σ"})
+
+def fts_fold(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFD", text.lower())
+    return _COMBINING_RE.sub("", text).translate(_FINAL_SIGMA)
+
+def has_fts_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?",
+                        (FTS_TABLE,)).fetchone() is not None
+
+def build_fts_index(conn: sqlite3.Connection, after_rowid: int = 0) -> int:
+    """
+    Index messages with rowid > after_rowid; after_rowid=0 rebuilds from scratch.
+
+    Upserts keep a message's rowid and never change its text (the text is
+    part of message_id), so incremental runs only need to index new rows.
+    Returns the number of rows indexed.
+    """
+    conn.create_function("fts_fold", 1, fts_fold, deterministic=True)
+    if after_rowid == 0:
+        conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    conn.execute(f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='', prefix='2 3',
+        tokenize='unicode61 remove_diacritics 2'
     )""")
+    cur = conn.execute(f"""
+    INSERT INTO {FTS_TABLE}(rowid, text)
+    SELECT id, fts_fold(text_clean) FROM message_data
+    WHERE id > ? AND text_clean != ''""", (after_rowid,))
+    return cur.rowcount
 
-    for col in ("conversation_id", "timestamp_ms", "year", "month",
-                "language_guess", "conversation_title", "is_me"):
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{col} ON messages({col})")
-
-    cur.executemany("""
-    INSERT OR REPLACE INTO messages VALUES (
-        ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?
-    )""", [
-        (r.message_id, r.conversation_id, r.conversation_title,
-         int(r.is_group_chat),
-         json.dumps(r.participants, ensure_ascii=False),
-         r.sender_name, int(r.is_me),
-         r.timestamp_iso, r.timestamp_ms,
-         r.year, r.month, r.day, r.hour, r.minute, r.weekday,
-         r.text_original, r.text_clean, r.text_no_urls,
-         r.char_count, r.word_count, r.language_guess,
-         int(r.has_urls), r.reaction_count,
-         r.photos_count, r.videos_count, r.audio_count,
-         r.files_count, r.gifs_count, r.shares_count,
-         int(r.sticker_present), r.source_json, r.source_folder)
-        for r in records
-    ])
-    conn.commit()
-    conn.close()
+def fts_query(text: str) -> str:
+    """
+    Turn plain search words into an FTS5 query: every word must match
+    (implicit AND) and a trailing * makes it a prefix search (καφ*).
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        for token in WORD_RE.findall(fts_fold(word)):
+            terms.append(f'"{token}"')
+        if prefix and terms:
+            terms[-1] += "*"
+    return " ".join(terms)
+
+def search_messages(
+    db_path: Path,
+    query: str,
+    limit: int = 20,
+    is_me: Optional[bool] = None,
+    conversation: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Best-ranked (bm25) messages matching query; needs an index built with --fts."""
+    match = fts_query(query)
+    if not match:
+        return []
+    sql = f"""
+    SELECT {TIMESTAMP_ISO_SQL}, c.title, p.name, d.is_me, d.text_clean, f.rank
+    FROM {FTS_TABLE} f
+    JOIN message_data  d ON d.id = f.rowid
+    JOIN conversations c ON c.id = d.conversation
+    JOIN participants  p ON p.id = d.sender
+    WHERE {FTS_TABLE} MATCH ?"""
+    params: List[Any] = [match]
+    if is_me is not None:
+        sql += " AND d.is_me = ?"
+        params.append(int(is_me))
+    if conversation:
+        sql += " AND c.title = ?"
+        params.append(conversation)
+    sql += " ORDER BY f.rank LIMIT ?"
+    params.append(limit)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        if not has_fts_index(conn):
+            raise RuntimeError(f"{db_path} has no {FTS_TABLE} table — re-run the "
+                               f"extractor with --fts")
+        return [
+            {"timestamp_iso": ts, "conversation_title": title, "sender_name": sender,
+             "is_me": bool(me), "text": text, "score": -rank}
+            for ts, title, sender, me, text, rank in conn.execute(sql, params)
+        ]
+    finally:
+        conn.close()
+
+SINK_BATCH_RECORDS = 1_000
+SINK_QUEUE_BATCHES = 16
+
+class SinkError(RuntimeError):
+    """One or more sinks failed; every other sink was written and closed normally."""
+
+    def __init__(self, failures: Dict[str, BaseException]) -> None:
+        super().__init__("; ".join(f"{name}: {exc}" for name, exc in failures.items()))
+        self.failures = failures
+
+def _write_batch(sink: Sink, batch: List[MessageRecord],
+                 failures: Dict[str, BaseException]) -> None:
+    if sink.name in failures:
+        return
+    try:
+        with PROFILE.stage(sink.name, memory=False) as counts:
+            for rec in batch:
+                sink.write(rec)
+            counts["items"] = len(batch)
+    except Exception as exc:
+        failures[sink.name] = exc
+
+def _close_sink(sink: Sink, failures: Dict[str, BaseException], memory: bool) -> None:
+    try:
+        with PROFILE.stage(sink.name, memory=memory):
+            sink.close()
+    except Exception as exc:
+        failures.setdefault(sink.name, exc)
+
+def _drain_sink(sink: Sink, batches: "queue.Queue[Optional[List[MessageRecord]]]",
+                failures: Dict[str, BaseException]) -> None:
+    """Thread body: write batches until the None sentinel, then close the sink."""
+    try:
+        for batch in iter(batches.get, None):
+            _write_batch(sink, batch, failures)     # after a failure: drain only
+    finally:
+        _close_sink(sink, failures, memory=False)
+
+def run_sinks(records: Iterable[MessageRecord], sinks: List[Sink],
+              threads: bool = False) -> int:
+    """
+    Fan every record out to every sink in a single pass. Returns the record
+    count. Records are handed over in batches of SINK_BATCH_RECORDS, which
+    under --profile are timed per sink.
+
+    With threads=True every sink gets a thread of its own, fed the same
+    batches through a bounded queue, so SQLite inserts and file writes
+    overlap one another. Parsing does not overlap with them: iter_records
+    yields nothing until every file has been parsed and sorted, so only the
+    sort merge runs alongside the sinks. Each sink still sees every record,
+    in stream order, so its output is the same as in serial mode (under
+    --profile, cpu_s is then process-wide). A sink that raises stops receiving records and is
+    closed; the others run to the end, then SinkError reports the failures.
+    """
+    records  = iter(records)
+    failures: Dict[str, BaseException] = {}
+    count    = 0
+    if not threads or len(sinks) < 2:
+        try:
+            for batch in iter(lambda: list(islice(records, SINK_BATCH_RECORDS)), []):
+                for sink in sinks:
+                    _write_batch(sink, batch, failures)
+                count += len(batch)
+        finally:
+            for sink in sinks:
+                _close_sink(sink, failures, memory=True)
+    else:
+        queues = [queue.Queue(SINK_QUEUE_BATCHES) for _ in sinks]
+        with ThreadPoolExecutor(len(sinks), thread_name_prefix="sink") as pool:
+            for sink, batches in zip(sinks, queues):
+                pool.submit(_drain_sink, sink, batches, failures)
+            try:
+                for batch in iter(lambda: list(islice(records, SINK_BATCH_RECORDS)), []):
+                    for batches in queues:
+                        batches.put(batch)
+                    count += len(batch)
+            finally:
+                for batches in queues:
+                    batches.put(None)
+    if failures:
+        raise SinkError(failures)
+    return count
 
 # ---------------------------------------------------------------------------
 # Markdown shards  (my messages only — same as v1)
 # ---------------------------------------------------------------------------
 
-def build_markdown_shards(records: List[MessageRecord], md_root: Path) -> None:
-    my_records = [r for r in records if r.is_me]
-    grouped: Dict[Tuple[str, int, int], List[MessageRecord]] = defaultdict(list)
-    for rec in my_records:
-        grouped[(rec.conversation_title, rec.year, rec.month)].append(rec)
+SHARD_WRITE_THREADS = 8
+SHARD_MAX_PENDING   = 256
+
+def shard_path(md_root: Path, title: str, year: int, month: int) -> Path:
+    return md_root / safe_slug(title) / f"{year:04d}-{month:02d}.md"
+
+def render_markdown_shard(title: str, year: int, month: int,
+                          msgs: List[MessageRecord]) -> bytes:
+    parts = [f"# {title}\n\n- Period: {year}-{month:02d}\n- Messages: {len(msgs)}\n\n---\n\n"]
+    parts += [f"## {m.timestamp_iso}\n\n"
+              f"- {m.weekday}  {m.hour:02d}:{m.minute:02d}"
+              f"  lang:{m.language_guess}  words:{m.word_count}\n\n"
+              f"```\n{m.text_clean}\n```\n\n" for m in msgs]
+    return "".join(parts).encode("utf-8")
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    """Write data to path in one call, unless path already holds exactly data."""
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        ensure_dir(path.parent)
+    path.write_bytes(data)
+    return True
+
+def write_markdown_shard(md_root: Path, title: str, year: int, month: int,
+                         msgs: List[MessageRecord]) -> bool:
+    """Render and write one shard; False if the file was already up to date."""
+    return write_if_changed(shard_path(md_root, title, year, month),
+                            render_markdown_shard(title, year, month, msgs))
+
+class ShardWriter:
+    """
+    Renders and writes markdown shards in a thread pool, each file in a
+    single write and only when its content changed, so a re-run leaves
+    unchanged shards (and their mtimes) alone. At most SHARD_MAX_PENDING
+    shards are in flight; two titles with the same slug still write their
+    shared file in submission order. On a single CPU (workers=1 by
+    default) shards are written inline, where the pool only adds overhead.
+    """
+
+    def __init__(self, md_root: Path, workers: Optional[int] = None) -> None:
+        if workers is None:
+            workers = SHARD_WRITE_THREADS if (os.cpu_count() or 1) > 1 else 1
+        self.md_root   = md_root
+        self.written   = 0
+        self.unchanged = 0
+        self._pool     = ThreadPoolExecutor(workers, thread_name_prefix="shard") if workers > 1 else None
+        self._pending: deque = deque()
+        self._by_path: Dict[Path, Any] = {}
+
+    def submit(self, title: str, year: int, month: int, msgs: List[MessageRecord]) -> None:
+        if self._pool is None:
+            if write_markdown_shard(self.md_root, title, year, month, msgs):
+                self.written += 1
+            else:
+                self.unchanged += 1
+            return
+        path    = shard_path(self.md_root, title, year, month)
+        earlier = self._by_path.get(path)
+        if earlier is not None:
+            earlier.result()
+        future = self._pool.submit(write_markdown_shard, self.md_root, title, year, month, msgs)
+        self._by_path[path] = future
+        self._pending.append((path, future))
+        while len(self._pending) > SHARD_MAX_PENDING:
+            self._collect()
+
+    def _collect(self) -> None:
+        path, future = self._pending.popleft()
+        if self._by_path.get(path) is future:
+            del self._by_path[path]
+        if future.result():
+            self.written += 1
+        else:
+            self.unchanged += 1
+
+    def close(self) -> None:
+        try:
+            while self._pending:
+                self._collect()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+        if self.written or self.unchanged:
+            print(f"    {'markdown shards':<20} {self.written:>12,} written"
+                  f"  ({self.unchanged:,} unchanged)")
+
+def _previous_month(year: int, month: int) -> Tuple[int, int]:
+    return (year, month - 1) if month > 1 else (year - 1, 12)
+
+class MarkdownShardSink(Sink):
+    """
+    One markdown file per (conversation, month) of the subject's messages.
+
+    Records arrive in timestamp order, so a month is complete once a later
+    month shows up. Shards are flushed one month behind the stream, which
+    tolerates UTC-offset changes around month boundaries and keeps only
+    about two months of messages in memory.
+    """
+
+    name = "markdown_shards"
+
+    def __init__(self, md_root: Path) -> None:
+        self.md_root = md_root
+        self.pending: Dict[Tuple[int, int], Dict[str, List[MessageRecord]]] = {}
+        self._writer: Optional[ShardWriter] = None
+
+    def write(self, rec: MessageRecord) -> None:
+        if not rec.is_me:
+            return
+        key = (rec.year, rec.month)
+        if key not in self.pending:
+            self._flush_before(_previous_month(*key))
+        self.pending.setdefault(key, {}).setdefault(rec.conversation_title, []).append(rec)
+
+    def _flush_before(self, key: Tuple[int, int]) -> None:
+        for done in sorted(k for k in self.pending if k < key):
+            if self._writer is None:
+                self._writer = ShardWriter(self.md_root)
+            for title, msgs in self.pending.pop(done).items():
+                self._writer.submit(title, done[0], done[1], msgs)
+
+    def close(self) -> None:
+        try:
+            self._flush_before((10_000, 1))
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+# ---------------------------------------------------------------------------
+# Columnar store  (--columns)
+# ---------------------------------------------------------------------------
+
+COLUMNS_DIR        = "columns"
+COLUMNS_META       = "columns.json"
+COLUMN_BUFFER_ROWS = 65_536
+NPY_HEADER_BYTES   = 128        # fixed, so the row count can be rewritten in place
+
+# Fixed-width columns: (name, array typecode, .npy dtype), in ColumnarSink._row order.
+NUMERIC_COLUMNS = (
+    ("timestamp_ms",   "q", "<i8"),
+    ("utc_offset_s",   "i", "<i4"),
+    ("conversation",   "i", "<i4"),     # index into conversation_ids / _titles
+    ("sender",         "i", "<i4"),     # index into sender_names
+    ("is_me",          "B", "|b1"),
+    ("year",           "h", "<i2"),
+    ("month",          "B", "|u1"),
+    ("day",            "B", "|u1"),
+    ("hour",           "B", "|u1"),
+    ("minute",         "B", "|u1"),
+    ("weekday",        "B", "|u1"),     # index into WEEKDAYS
+    ("char_count",     "i", "<i4"),
+    ("word_count",     "i", "<i4"),
+    ("language",       "B", "|u1"),     # index into LANGUAGES
+    ("has_urls",       "B", "|b1"),
+    ("reaction_count", "i", "<i4"),
+)
+NPY_FORMATS = {"<i8": "q", "<i4": "i", "<i2": "h", "|u1": "B", "|b1": "?"}
+
+def npy_header(descr: str, rows: int) -> bytes:
+    """A .npy (format 1.0) header for a 1-D array, padded to NPY_HEADER_BYTES."""
+    text = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, rows)
+    return (b"\x93NUMPY\x01\x00" + (NPY_HEADER_BYTES - 10).to_bytes(2, "little")
+            + text.ljust(NPY_HEADER_BYTES - 11).encode("latin-1") + b"\n")
+
+def read_npy_header(f: BinaryIO) -> Tuple[str, int, int]:
+    """(dtype, rows, data offset) of a 1-D .npy file written by npy_header()."""
+    head = f.read(10)
+    if head[:8] != b"\x93NUMPY\x01\x00":
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not a .npy 1.0 file")
+    size = int.from_bytes(head[8:10], "little")
+    meta = re.match(r"\{'descr': '([^']+)', 'fortran_order': False, 'shape': \((\d+),\), \}",
+                    f.read(size).decode("latin-1"))
+    if meta is None:
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not a 1-D column")
+    return meta.group(1), int(meta.group(2)), 10 + size
+
+def mmap_column(path: Path) -> memoryview:
+    """
+    A numeric column as a read-only memoryview of an mmap of the file, so
+    aggregating it reads no more than the pages touched. Values are
+    little-endian; numpy.load(path, mmap_mode="r") works too.
+    """
+    with path.open("rb") as f:
+        descr, rows, offset = read_npy_header(f)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)[offset:]
+    return view[:rows * int(descr[2:])].cast(NPY_FORMATS[descr])
+
+def read_string_column(root: Path, name: str) -> List[str]:
+    """Every value of the string column name in root, decoded."""
+    offsets = mmap_column(root / f"{name}.offsets.npy")
+    data    = (root / f"{name}.utf8").read_bytes()
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+class NpyWriter:
+    """A 1-D .npy file written or extended in chunks; close() sets the row count."""
+
+    def __init__(self, path: Path, descr: str, append: bool = False) -> None:
+        self.path  = path
+        self.descr = descr
+        if append:
+            self._f = path.open("r+b")
+            found, self.rows, offset = read_npy_header(self._f)
+            size = int(descr[2:])
+            if found != descr or self._f.seek(0, os.SEEK_END) != offset + self.rows * size:
+                self._f.close()
+                raise ValueError(f"{path} does not match its header")
+        else:
+            self._f = path.open("wb")
+            self._f.write(npy_header(descr, 0))
+            self.rows = 0
+
+    def write(self, values: array) -> None:
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        values.tofile(self._f)
+        self.rows += len(values)
+
+    def close(self) -> None:
+        self._f.seek(0)
+        self._f.write(npy_header(self.descr, self.rows))
+        self._f.close()
+
+class StringColumnWriter:
+    """<name>.utf8 plus <name>.offsets.npy: rows + 1 int64 offsets into it."""
+
+    def __init__(self, root: Path, name: str, append: bool = False) -> None:
+        self.offsets = NpyWriter(root / f"{name}.offsets.npy", "<i8", append)
+        self._data   = (root / f"{name}.utf8").open("ab" if append else "wb")
+        self._end    = self._data.tell()
+        self._pending: List[bytes] = []
+        self._ends   = array("q")
+        if not append:
+            self._ends.append(0)
+        elif self.offsets.rows == 0 or mmap_column(self.offsets.path)[-1] != self._end:
+            self.close()
+            raise ValueError(f"{self.offsets.path} does not match {name}.utf8")
+
+    @property
+    def rows(self) -> int:
+        return self.offsets.rows + len(self._ends) - 1
+
+    def append(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self._end += len(data)
+        self._pending.append(data)
+        self._ends.append(self._end)
+
+    def flush(self) -> None:
+        self._data.write(b"".join(self._pending))
+        self.offsets.write(self._ends)
+        self._pending, self._ends = [], array("q")
+
+    def close(self) -> None:
+        self.flush()
+        self._data.close()
+        self.offsets.close()
+
+def write_string_column(root: Path, name: str, values: Iterable[str]) -> None:
+    column = StringColumnWriter(root, name)
+    for value in values:
+        column.append(value)
+    column.close()
+
+class ColumnarSink(Sink):
+    """
+    columns/: the records as a column store, for analytics that should not
+    have to parse messages.jsonl.
+
+    Each NUMERIC_COLUMNS entry is a 1-D little-endian .npy file that
+    mmap_column() (or numpy.load(..., mmap_mode="r")) maps without
+    copying; row i of every column is the i-th record of the stream.
+    conversation and sender index the conversation_ids /
+    conversation_titles and sender_names string columns. A string column
+    is <name>.utf8 plus <name>.offsets.npy (int64, rows + 1), row i being
+    utf8[offsets[i]:offsets[i + 1]]; text_clean is one. columns.json lists
+    the columns, the row count and the weekday / language code tables.
+
+    With append=True (--incremental) the new rows are added to the end, so,
+    like messages.jsonl, the store is then no longer in timestamp order. A
+    store that does not match its columns.json raises ValueError.
+    """
 
-    for (title, year, month), msgs in grouped.items():
-        folder = md_root / safe_slug(title)
-        ensure_dir(folder)
-        path = folder / f"{year:04d}-{month:02d}.md"
-        with path.open("w", encoding="utf-8") as f:
-            f.write(f"# {title}\n\n")
-            f.write(f"- Period: {year}-{month:02d}\n")
-            f.write(f"- Messages: {len(msgs)}\n\n---\n\n")
-            for m in msgs:
-                f.write(f"## {m.timestamp_iso}\n\n")
-                f.write(f"- {m.weekday}  {m.hour:02d}:{m.minute:02d}"
-                        f"  lang:{m.language_guess}  words:{m.word_count}\n\n")
-                f.write(f"```\n{m.text_clean}\n```\n\n")
+    name = COLUMNS_DIR
+
+    def __init__(self, root: Path, append: bool = False) -> None:
+        self.root   = root
+        self.append = append
+        self._numeric: Optional[List[NpyWriter]] = None
+        self._buffers: List[array] = []
+        self._text: Optional[StringColumnWriter] = None
+        self._conversations: Dict[str, int] = {}
+        self._titles:  List[str] = []
+        self._senders: Dict[str, int] = {}
+
+    def open(self) -> None:
+        """Open (or, with append, check and reopen) the store; write() does this lazily."""
+        rows = 0
+        if self.append:
+            meta = json.loads((self.root / COLUMNS_META).read_text(encoding="utf-8"))
+            rows = meta["rows"]
+            ids  = read_string_column(self.root, "conversation_ids")
+            self._conversations = {cid: i for i, cid in enumerate(ids)}
+            self._titles  = read_string_column(self.root, "conversation_titles")
+            self._senders = {n: i for i, n in enumerate(read_string_column(self.root, "sender_names"))}
+        else:
+            ensure_dir(self.root)
+        self._numeric = []
+        try:
+            for name, _, descr in NUMERIC_COLUMNS:
+                self._numeric.append(NpyWriter(self.root / f"{name}.npy", descr, self.append))
+            self._text = StringColumnWriter(self.root, "text_clean", self.append)
+            if any(c.rows != rows for c in self._numeric) or self._text.rows != rows:
+                raise ValueError(f"{self.root} does not match {COLUMNS_META}")
+        except (OSError, ValueError):
+            for column in self._numeric:
+                column.close()
+            if self._text is not None:
+                self._text.close()
+            self._numeric, self._text = None, None
+            raise
+        self._buffers = [array(typecode) for _, typecode, _ in NUMERIC_COLUMNS]
+
+    def _row(self, r: MessageRecord) -> tuple:
+        conv = self._conversations.get(r.conversation_id)
+        if conv is None:
+            conv = self._conversations[r.conversation_id] = len(self._conversations)
+            self._titles.append(r.conversation_title)
+        sender = self._senders.get(r.sender_name)
+        if sender is None:
+            sender = self._senders[r.sender_name] = len(self._senders)
+        return (r.timestamp_ms, utc_offset_seconds(r.timestamp_iso), conv, sender,
+                r.is_me, r.year, r.month, r.day, r.hour, r.minute,
+                WEEKDAY_CODES[r.weekday], r.char_count, r.word_count,
+                LANGUAGE_CODES[r.language_guess], r.has_urls, r.reaction_count)
+
+    def write(self, rec: MessageRecord) -> None:
+        if self._numeric is None:
+            self.open()
+        for buffer, value in zip(self._buffers, self._row(rec)):
+            buffer.append(value)
+        self._text.append(rec.text_clean)
+        if len(self._buffers[0]) >= COLUMN_BUFFER_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        for column, buffer in zip(self._numeric, self._buffers):
+            column.write(buffer)
+        self._buffers = [array(b.typecode) for b in self._buffers]
+        self._text.flush()
+
+    def close(self) -> None:
+        if self._numeric is None:
+            return
+        self._flush()
+        for column in self._numeric:
+            column.close()
+        self._text.close()
+        rows = self._text.rows
+        self._numeric = None
+
+        write_string_column(self.root, "conversation_ids", self._conversations)
+        write_string_column(self.root, "conversation_titles", self._titles)
+        write_string_column(self.root, "sender_names", self._senders)
+        meta = {
+            "rows":      rows,
+            "numeric":   {name: descr for name, _, descr in NUMERIC_COLUMNS},
+            "strings":   {"text_clean": rows,
+                          "conversation_ids":    len(self._conversations),
+                          "conversation_titles": len(self._titles),
+                          "sender_names":        len(self._senders)},
+            "weekdays":  list(WEEKDAYS),
+            "languages": list(LANGUAGES),
+        }
+        tmp = self.root / (COLUMNS_META + ".tmp")
+        tmp.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.root / COLUMNS_META)
 
 # ---------------------------------------------------------------------------
 # Style profiles  (my messages only — same as v1)
 # ---------------------------------------------------------------------------
 
-def top_terms(texts: List[str], limit: int = 40) -> List[Tuple[str, int]]:
-    STOPWORDS = {
-        "the","and","to","a","i","you","it","is","in","of","for","on","that","this",
-        "me","my","we","our","your","be","are","am","was","were","with","at","as",
-        "but","if","so","not","do","did","have","has","had","will","would","can",
-        "could","just","im","its","ill","dont","yeah","ok","okay","yes","no","hi",
-        "και","να","σε","το","τη","της","των","τα","με","για","που","από","στο",
-        "στη","στον","στην","είναι","θα","δεν","μια","ένα","έχω","έχει","πως","τι",
-        "την","τον","οι","ο","η","μου","σου","μας","σας","τους","τις","σαν","αλλά",
-        "αν","ότι","κάτι","κάποιος","εδώ","εκεί","τώρα","πότε","πού","πώς","ναι",
-    }
-    counter: Counter = Counter()
-    for text in texts:
-        for token in WORD_RE.findall(text.lower()):
-            if len(token) >= 2 and token not in STOPWORDS:
-                counter[token] += 1
-    return counter.most_common(limit)
+STOPWORDS = frozenset({
+    "the","and","to","a","i","you","it","is","in","of","for","on","that","this",
+    "me","my","we","our","your","be","are","am","was","were","with","at","as",
+    "but","if","so","not","do","did","have","has","had","will","would","can",
+    "could","just","im","its","ill","dont","yeah","ok","okay","yes","no","hi",
+    "και","να","σε","το","τη","της","των","τα","με","για","που","από","στο",
+    "στη","στον","στην","είναι","θα","δεν","μια","ένα","έχω","έχει","πως","τι",
+    "την","τον","οι","ο","η","μου","σου","μας","σας","τους","τις","σαν","αλλά",
+    "αν","ότι","κάτι","κάποιος","εδώ","εκεί","τώρα","πότε","πού","πώς","ναι",
+})
+
+TOKEN_CACHE_SIZE = 1 << 15
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokenise(text: str) -> Tuple[int, Tuple[str, ...]]:
+    """
+    (word count, terms) of a cleaned text, tokenised once and cached: the
+    word count is taken while a message is parsed and the terms when it is
+    aggregated right after, and chat repeats short messages a lot. Terms
+    are the lower-cased words of 2+ characters that are not STOPWORDS,
+    interned so all counters share one string per term.
+    """
+    lowered = text.lower()
+    words   = WORD_RE.findall(lowered)
+    # Lower-casing keeps \w-ness per character; only a length change (İ)
+    # can move word boundaries.
+    count = len(words) if len(lowered) == len(text) else len(WORD_RE.findall(text))
+    return count, tuple([sys.intern(t) for t in words if len(t) >= 2 and t not in STOPWORDS])
+
+def term_tokens(text: str) -> Tuple[str, ...]:
+    return tokenise(text)[1]
 
 def hour_bucket(hour: int) -> str:
     if 5  <= hour < 12: return "morning"
@@ -481,14 +3069,207 @@ def hour_bucket(hour: int) -> str:
     if 17 <= hour < 22: return "evening"
     return "night"
 
-def infer_style_hints(msgs: List[MessageRecord]) -> Dict[str, Any]:
-    if not msgs:
+def ranked(counter: Counter, n: Optional[int] = None) -> List[Tuple[Any, int]]:
+    """counter.most_common(n), with ties broken by key so merge order never matters."""
+    items = counter.items()
+    if n is None:
+        return sorted(items, key=lambda kv: (-kv[1], kv[0]))
+    return heapq.nsmallest(n, items, key=lambda kv: (-kv[1], kv[0]))
+
+def _uncount(counter: Counter, key: Any, n: int = 1) -> None:
+    counter[key] -= n
+    if counter[key] <= 0:
+        del counter[key]
+
+class TermSketch(Counter):
+    """
+    Space-Saving term counter (--term-sketch): at most 2 * capacity terms,
+    however long the conversation.
+
+    Counts are exact until the table first outgrows 2 * capacity. It is then
+    trimmed to the capacity highest counts and floor rises to the highest
+    count dropped; a term first seen (or seen again) after that starts from
+    floor. Every count is therefore an upper bound, true <= count <= true +
+    errors[term], and any term truly more frequent than floor is kept.
+    Sketches merge (counts and floors add), so per-file sketches still
+    combine, though not always into what one pass would give.
+    """
+
+    def __init__(self, capacity: int, counts: Optional[Dict[str, int]] = None,
+                 floor: int = 0, errors: Optional[Dict[str, int]] = None) -> None:
+        self.capacity = capacity
+        self.floor    = floor
+        self.errors: Dict[str, int] = dict(errors or {})
+        super().__init__()
+        dict.update(self, counts or {})
+
+    def __reduce__(self) -> Tuple[type, tuple]:
+        return TermSketch, (self.capacity, dict(self), self.floor, self.errors)
+
+    def __delitem__(self, term: str) -> None:
+        super().__delitem__(term)
+        self.errors.pop(term, None)
+
+    def update(self, terms: Any = None, **_: Any) -> None:
+        if terms is None:
+            return
+        if isinstance(terms, TermSketch):
+            self._merge(terms)
+        else:
+            if self.floor:
+                for term in terms:
+                    if term not in self:
+                        self[term] = self.errors[term] = self.floor
+            super().update(terms)
+        if len(self) > 2 * self.capacity:
+            self._trim()
+
+    def _merge(self, other: "TermSketch") -> None:
+        # A term missing from one side may have been seen there up to its floor.
+        if other.floor:
+            for term in self.keys() - other.keys():
+                self[term] += other.floor
+                self.errors[term] = self.errors.get(term, 0) + other.floor
+        for term, count in other.items():
+            error = other.errors.get(term, 0)
+            if term not in self:
+                self[term], error = self.floor, error + self.floor
+            self[term] += count
+            if error:
+                self.errors[term] = self.errors.get(term, 0) + error
+        self.floor += other.floor
+
+    def _trim(self) -> None:
+        ordered = ranked(self)
+        self.floor = max(self.floor, ordered[self.capacity][1])
+        kept = dict(ordered[:self.capacity])
+        self.errors = {t: e for t, e in self.errors.items() if t in kept}
+        dict.clear(self)
+        dict.update(self, kept)
+
+    def state(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "floor": self.floor, "errors": self.errors}
+
+class MessageStats:
+    """
+    Mergeable running totals over a set of the subject's messages.
+
+    add() folds in one record, merge() folds in the totals of a disjoint set
+    of records, so stats built per file (in worker processes) or saved by an
+    earlier run combine into exactly what a single pass would produce.
+    discard() takes back a record that turned out to be a duplicate. With
+    term_capacity, terms is a TermSketch of that capacity instead of an
+    exact Counter.
+    """
+
+    COUNTERS = ("languages", "time_of_day", "weekdays", "months", "terms")
+
+    def __init__(self, term_capacity: int = 0) -> None:
+        self.participants: List[str] = []
+        self.is_group_chat = False
+        self.first_ms: Optional[int] = None
+        self.last_ms: Optional[int]  = None
+        self.first_message = ""
+        self.last_message  = ""
+        self.count         = 0
+        self.word_sum      = 0
+        self.char_sum      = 0
+        self.url_count     = 0
+        self.text_count    = 0
+        self.languages: Counter   = Counter()
+        self.time_of_day: Counter = Counter()
+        self.weekdays: Counter    = Counter()
+        self.months: Counter      = Counter()
+        self.terms: Counter       = TermSketch(term_capacity) if term_capacity else Counter()
+
+    def _take_first(self, other: Any) -> None:
+        # Ties keep the earlier-added side, matching the stable timestamp sort.
+        if self.first_ms is None or other.first_ms < self.first_ms:
+            self.first_ms      = other.first_ms
+            self.first_message = other.first_message
+            self.participants  = other.participants
+            self.is_group_chat = other.is_group_chat
+        if self.last_ms is None or other.last_ms >= self.last_ms:
+            self.last_ms      = other.last_ms
+            self.last_message = other.last_message
+
+    def add(self, m: MessageRecord) -> None:
+        if self.first_ms is None or m.timestamp_ms < self.first_ms:
+            self.first_ms      = m.timestamp_ms
+            self.first_message = m.timestamp_iso
+            self.participants  = m.participants
+            self.is_group_chat = m.is_group_chat
+        if self.last_ms is None or m.timestamp_ms >= self.last_ms:
+            self.last_ms      = m.timestamp_ms
+            self.last_message = m.timestamp_iso
+        self.count     += 1
+        self.word_sum  += m.word_count
+        self.char_sum  += m.char_count
+        self.url_count += m.has_urls
+        self.languages[m.language_guess]      += 1
+        self.time_of_day[hour_bucket(m.hour)] += 1
+        self.weekdays[m.weekday]              += 1
+        self.months[f"{m.year}-{m.month:02d}"] += 1
+        if m.text_clean:
+            self.text_count += 1
+            self.terms.update(term_tokens(m.text_clean))
+
+    def discard(self, m: MessageRecord) -> None:
+        # Only ever called for an exact duplicate of a record that stays
+        # counted, so first / last / participants are unaffected.
+        self.count     -= 1
+        self.word_sum  -= m.word_count
+        self.char_sum  -= m.char_count
+        self.url_count -= m.has_urls
+        _uncount(self.languages, m.language_guess)
+        _uncount(self.time_of_day, hour_bucket(m.hour))
+        _uncount(self.weekdays, m.weekday)
+        _uncount(self.months, f"{m.year}-{m.month:02d}")
+        if m.text_clean:
+            self.text_count -= 1
+            for term in term_tokens(m.text_clean):
+                _uncount(self.terms, term)
+
+    def merge(self, other: "MessageStats", terms: bool = True) -> None:
+        if not other.count:
+            return
+        self._take_first(other)
+        self.count      += other.count
+        self.word_sum   += other.word_sum
+        self.char_sum   += other.char_sum
+        self.url_count  += other.url_count
+        self.text_count += other.text_count
+        for name in self.COUNTERS:
+            if terms or name != "terms":
+                getattr(self, name).update(getattr(other, name))
+
+    def to_json(self) -> Dict[str, Any]:
+        data = dict(vars(self))
+        if isinstance(self.terms, TermSketch):
+            data["term_sketch"] = self.terms.state()
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "MessageStats":
+        data   = dict(data)
+        sketch = data.pop("term_sketch", None)
+        stats  = cls()
+        vars(stats).update(data)
+        for name in cls.COUNTERS:
+            setattr(stats, name, Counter(data[name]))
+        if sketch is not None:
+            stats.terms = TermSketch(sketch["capacity"], data["terms"], sketch["floor"],
+                                     sketch["errors"])
+        return stats
+
+def infer_style_hints(s: MessageStats) -> Dict[str, Any]:
+    if not s.count:
         return {}
-    avg_words  = mean(m.word_count for m in msgs)
-    avg_chars  = mean(m.char_count for m in msgs)
-    greek_n    = sum(1 for m in msgs if m.language_guess == "greek")
-    english_n  = sum(1 for m in msgs if m.language_guess == "english_or_latin")
-    mixed_n    = sum(1 for m in msgs if m.language_guess == "mixed")
+    avg_words  = s.word_sum / s.count
+    avg_chars  = s.char_sum / s.count
+    greek_n    = s.languages["greek"]
+    english_n  = s.languages["english_or_latin"]
+    mixed_n    = s.languages["mixed"]
 
     if   avg_words < 6:  length_style = "very_short"
     elif avg_words < 14: length_style = "short"
@@ -505,8 +3286,8 @@ def infer_style_hints(msgs: List[MessageRecord]) -> Dict[str, Any]:
     else:
         dominant_language = "mixed"
 
-    night_ratio = sum(1 for m in msgs if hour_bucket(m.hour) == "night") / len(msgs)
-    url_ratio   = sum(1 for m in msgs if m.has_urls) / len(msgs)
+    night_ratio = s.time_of_day["night"] / s.count
+    url_ratio   = s.url_count / s.count
 
     return {
         "dominant_language":  dominant_language,
@@ -517,69 +3298,305 @@ def infer_style_hints(msgs: List[MessageRecord]) -> Dict[str, Any]:
         "average_words":      round(avg_words, 2),
     }
 
-def build_style_summaries(records: List[MessageRecord], output_path: Path) -> None:
-    # Style summaries are computed over subject's messages only
-    my_records = [r for r in records if r.is_me]
-    by_conv: Dict[str, List[MessageRecord]] = defaultdict(list)
-    for rec in my_records:
-        by_conv[rec.conversation_title].append(rec)
-
-    summaries = {}
-    for title, msgs in sorted(by_conv.items()):
-        texts = [m.text_clean for m in msgs if m.text_clean]
-        if not texts:
-            continue
-        summaries[title] = {
-            "conversation_title":     title,
-            "participants":           msgs[0].participants,
-            "is_group_chat":          msgs[0].is_group_chat,
-            "message_count":          len(msgs),
-            "first_message":          msgs[0].timestamp_iso,
-            "last_message":           msgs[-1].timestamp_iso,
-            "average_word_count":     round(mean(m.word_count for m in msgs), 2),
-            "average_char_count":     round(mean(m.char_count for m in msgs), 2),
-            "language_distribution":  dict(Counter(m.language_guess for m in msgs)),
-            "time_of_day":            dict(Counter(hour_bucket(m.hour) for m in msgs)),
-            "weekday_distribution":   dict(Counter(m.weekday for m in msgs)),
-            "month_distribution":     dict(Counter(f"{m.year}-{m.month:02d}" for m in msgs)),
-            "messages_with_urls":     sum(1 for m in msgs if m.has_urls),
-            "top_terms":              top_terms(texts),
-            "style_hints":            infer_style_hints(msgs),
-        }
-
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(summaries, f, ensure_ascii=False, indent=2)
-
 # ---------------------------------------------------------------------------
-# Global summary  (my messages only — comparable to v1)
+# Aggregates  (style_profiles.json, global_summary.json, print_stats)
 # ---------------------------------------------------------------------------
 
-def save_global_summary(records: List[MessageRecord], path: Path) -> None:
-    my_records = [r for r in records if r.is_me]
-    all_count  = len(records)
-    my_count   = len(my_records)
+def months_per_year(months: Counter) -> Counter:
+    years: Counter = Counter()
+    for key, count in months.items():
+        years[int(key.split("-")[0])] += count
+    return years
 
-    if not my_records:
-        summary = {"message_count": 0}
-    else:
-        by_conv  = Counter(r.conversation_title for r in my_records)
-        by_lang  = Counter(r.language_guess for r in my_records)
-        by_year  = Counter(r.year for r in my_records)
-        by_month = Counter(f"{r.year:04d}-{r.month:02d}" for r in my_records)
-        summary  = {
+class Aggregates:
+    """
+    Every statistic the summary outputs report, fed once per record during
+    extraction: the total record count plus MessageStats per conversation
+    title over the subject's messages. The global summary is derived from
+    the per-conversation stats.
+
+    Aggregates merge like MessageStats: extraction builds one per file where
+    the file is parsed and merges them in file order, and --incremental
+    loads the previous run's Aggregates from manifest.json and folds in only
+    the new records.
+    """
+
+    def __init__(self, term_capacity: int = 0) -> None:
+        self.all_count = 0
+        self.term_capacity = term_capacity
+        self.by_conv: Dict[str, MessageStats] = {}
+
+    def add(self, rec: MessageRecord) -> None:
+        self.all_count += 1
+        if not rec.is_me:
+            return
+        stats = self.by_conv.get(rec.conversation_title)
+        if stats is None:
+            stats = self.by_conv[rec.conversation_title] = MessageStats(self.term_capacity)
+        stats.add(rec)
+
+    def discard(self, rec: MessageRecord) -> None:
+        self.all_count -= 1
+        if rec.is_me:
+            self.by_conv[rec.conversation_title].discard(rec)
+
+    def merge(self, other: "Aggregates") -> None:
+        self.all_count += other.all_count
+        for title, stats in other.by_conv.items():
+            mine = self.by_conv.get(title)
+            if mine is None:
+                self.by_conv[title] = stats
+            else:
+                mine.merge(stats)
+
+    def overall(self) -> MessageStats:
+        """Totals over all of the subject's messages (without term counts)."""
+        total = MessageStats()
+        for stats in self.by_conv.values():
+            total.merge(stats, terms=False)
+        return total
+
+    @property
+    def my_count(self) -> int:
+        return sum(s.count for s in self.by_conv.values())
+
+    def style_profiles(self) -> Dict[str, Dict[str, Any]]:
+        summaries = {}
+        for title, s in sorted(self.by_conv.items()):
+            if not s.text_count:
+                continue
+            summaries[title] = {
+                "conversation_title":     title,
+                "participants":           s.participants,
+                "is_group_chat":          s.is_group_chat,
+                "message_count":          s.count,
+                "first_message":          s.first_message,
+                "last_message":           s.last_message,
+                "average_word_count":     round(s.word_sum / s.count, 2),
+                "average_char_count":     round(s.char_sum / s.count, 2),
+                "language_distribution":  dict(ranked(s.languages)),
+                "time_of_day":            dict(ranked(s.time_of_day)),
+                "weekday_distribution":   dict(ranked(s.weekdays)),
+                "month_distribution":     dict(sorted(s.months.items())),
+                "messages_with_urls":     s.url_count,
+                "top_terms":              ranked(s.terms, 40),
+                "style_hints":            infer_style_hints(s),
+            }
+        return summaries
+
+    def global_summary(self) -> Dict[str, Any]:
+        total = self.overall()
+        if not total.count:
+            return {"message_count": 0}
+        by_conv = Counter({title: s.count for title, s in self.by_conv.items() if s.count})
+        return {
             "version":                __version__,
-            "total_messages_all":     all_count,
-            "message_count":          my_count,
+            "total_messages_all":     self.all_count,
+            "message_count":          total.count,
             "conversation_count":     len(by_conv),
-            "language_distribution":  dict(by_lang),
-            "messages_per_year":      {str(k): v for k, v in sorted(by_year.items())},
-            "messages_per_month":     dict(by_month),
-            "top_conversations":      by_conv.most_common(50),
-            "first_message":          my_records[0].timestamp_iso,
-            "last_message":           my_records[-1].timestamp_iso,
+            "language_distribution":  dict(ranked(total.languages)),
+            "messages_per_year":      {str(k): v for k, v in sorted(months_per_year(total.months).items())},
+            "messages_per_month":     dict(sorted(total.months.items())),
+            "top_conversations":      ranked(by_conv, 50),
+            "first_message":          total.first_message,
+            "last_message":           total.last_message,
         }
+
+    def save(self, output_root: Path) -> None:
+        for name, data in (("style_profiles.json", self.style_profiles()),
+                           ("global_summary.json", self.global_summary())):
+            with (output_root / name).open("w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def to_json(self) -> Dict[str, Any]:
+        data = {"all_count": self.all_count,
+                "by_conv":   {t: s.to_json() for t, s in self.by_conv.items()}}
+        if self.term_capacity:
+            data["term_capacity"] = self.term_capacity
+        return data
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Aggregates":
+        agg = cls(data.get("term_capacity", 0))
+        agg.all_count = data["all_count"]
+        agg.by_conv   = {t: MessageStats.from_json(s) for t, s in data["by_conv"].items()}
+        return agg
+
+# ---------------------------------------------------------------------------
+# Incremental runs  (manifest.json in the output folder)
+# ---------------------------------------------------------------------------
+
+MANIFEST_NAME = "manifest.json"
+
+def file_sha1(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def save_manifest(path: Path, options: dict, entries: Dict[str, dict],
+                  aggregates: Aggregates) -> None:
+    manifest = {"version": __version__, "options": options, "files": entries,
+                "aggregates": aggregates.to_json()}
     with path.open("w", encoding="utf-8") as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+def source_sha1(source: SourceFile, chunk_size: int = 1 << 20) -> str:
+    if not source.archive:
+        return file_sha1(source.path, chunk_size)
+    h = hashlib.sha1()
+    with _archive(source.root).open(source.rel) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def manifest_key(source: SourceFile) -> str:
+    """Files are keyed by export folder or zip name + path inside it."""
+    return f"{source.root.name}/{source.rel}"
+
+def scan_sources(
+    json_files: List[SourceFile],
+    previous: Optional[dict],
+    workers: int = 1,
+) -> Tuple[Dict[str, dict], List[SourceFile]]:
+    """
+    Fingerprint every source file against the previous manifest.
+
+    Returns (new manifest entries, files to parse). A file whose size and
+    mtime match the manifest is trusted without reading it. The others are
+    hashed, in `workers` threads (hashlib and zlib release the GIL), and
+    only parsed if their sha1 is new: not in the previous manifest and not
+    earlier in json_files. Overlapping exports repeat most conversation
+    files byte for byte, and those are read once; a touched-but-identical
+    file is skipped the same way.
+    """
+    old   = (previous or {}).get("files", {})
+    known = {entry["sha1"] for entry in old.values()}
+    entries: Dict[str, Optional[dict]] = {}
+    to_hash: List[Tuple[SourceFile, str, int, int]] = []
+
+    for source in json_files:
+        key         = manifest_key(source)
+        size, mtime = source.stat()
+        # Manifests written before multi-export keys used the bare folder path.
+        prev        = old.get(key) or (None if source.archive else old.get(source.rel))
+        if prev and prev["size"] == size and prev["mtime_ns"] == mtime:
+            entries[key] = prev
+            continue
+        entries[key] = None
+        to_hash.append((source, key, size, mtime))
+
+    changed: List[SourceFile] = []
+    with ThreadPoolExecutor(max(1, min(workers, len(to_hash)))) as pool:
+        digests = pool.map(source_sha1, [source for source, *_ in to_hash])
+        for (source, key, size, mtime), digest in zip(to_hash, digests):
+            entries[key] = {"size": size, "mtime_ns": mtime, "sha1": digest}
+            if digest not in known:
+                known.add(digest)
+                changed.append(source)
+
+    return entries, changed
+
+def mark_new_records(
+    records: Iterable[MessageRecord],
+    known: DedupeIndex,
+) -> Iterator[Tuple[MessageRecord, bool]]:
+    """Pair each record with True if its message_id was not in known yet (and add it)."""
+    for rec in records:
+        yield rec, known.add(bytes.fromhex(rec.message_id))
+
+def iter_sqlite_records(conn: sqlite3.Connection, where: str = "1",
+                        params: tuple = ()) -> Iterator[MessageRecord]:
+    """Records in stream order; where refers to the d/c/p/s aliases of MESSAGES_SELECT."""
+    cur = conn.execute(
+        f"{MESSAGES_SELECT} WHERE {where} ORDER BY d.timestamp_ms, d.id", params)
+    shared: Dict[str, List[str]] = {}
+    for row in cur:
+        yield record_from_row(row, shared)
+
+def refresh_markdown_shards(conn: sqlite3.Connection, md_root: Path,
+                            keys: Iterable[Tuple[str, int, int]]) -> None:
+    writer = ShardWriter(md_root)
+    try:
+        for title, year, month in sorted(keys):
+            msgs = list(iter_sqlite_records(
+                conn, "d.is_me = 1 AND c.title = ? AND d.year = ? AND d.month = ?",
+                (title, year, month)))
+            writer.submit(title, year, month, msgs)
+    finally:
+        writer.close()
+
+def run_incremental(records: Iterable[MessageRecord], output_root: Path,
+                    aggregates: Aggregates, fts: bool = False,
+                    compress: bool = False, columns: bool = False) -> Tuple[int, int]:
+    """
+    Merge freshly parsed records into an existing output folder.
+
+    Every record is upserted into messages.sqlite; records whose message_id
+    was not there before are appended to messages.jsonl / messages.csv,
+    folded into aggregates (the previous run's, from manifest.json), and
+    only the markdown shards they touch are rebuilt (from SQLite, so they
+    also contain the messages from earlier runs). The FTS index is extended
+    if it exists already or fts is set. message_ids.idx tells new records
+    from known ones and is saved again with the new digests, so merging a
+    further, overlapping export this way only adds what it lacks. With
+    columns, new records are appended to columns/ too; if that store is
+    missing or damaged it is rebuilt from messages.sqlite instead.
+    Returns (records seen, records new).
+    """
+    db        = SqliteSink(output_root / "messages.sqlite", upsert=True, fts=fts)
+    appenders: List[Sink] = [
+        JsonlSink(output_root / "messages.jsonl", append=True, compress=compress),
+        CsvSink(output_root / "messages.csv", append=True, compress=compress),
+    ]
+    rebuild_columns = False
+    if columns:
+        store = ColumnarSink(output_root / COLUMNS_DIR, append=True)
+        try:
+            store.open()
+            appenders.append(store)
+        except (OSError, ValueError) as exc:
+            print(f"  {COLUMNS_DIR}/ cannot be extended ({exc}) — rebuilding it.")
+            rebuild_columns = True
+    shard_keys: set = set()
+    total = new = 0
+
+    conn = db.connection()
+    db.fts = db.fts or has_fts_index(conn)
+    known = load_dedupe_index(output_root, conn)
+    try:
+        for rec, is_new in mark_new_records(records, known):
+            db.write(rec)
+            total += 1
+            if not is_new:
+                continue
+            new += 1
+            aggregates.add(rec)
+            for sink in appenders:
+                sink.write(rec)
+            if rec.is_me:
+                shard_keys.add((rec.conversation_title, rec.year, rec.month))
+    finally:
+        for sink in [db] + appenders:
+            sink.close()
+    known.save(output_root / DEDUPE_INDEX_NAME)
+
+    conn = sqlite3.connect(output_root / "messages.sqlite")
+    try:
+        refresh_markdown_shards(conn, output_root / "markdown_shards", shard_keys)
+        if rebuild_columns:
+            run_sinks(iter_sqlite_records(conn), [ColumnarSink(output_root / COLUMNS_DIR)])
+    finally:
+        conn.close()
+    aggregates.save(output_root)
+    return total, new
 
 # ---------------------------------------------------------------------------
 # Training instructions
@@ -621,35 +3638,35 @@ Run build_training_pairs.py to generate training_pairs.jsonl in your desired for
 # Pretty stats printer
 # ---------------------------------------------------------------------------
 
-def print_stats(records: List[MessageRecord], output_root: Path) -> None:
-    if not records:
+def print_stats(aggregates: Aggregates, output_root: Path) -> None:
+    if not aggregates.all_count:
         return
 
-    my_records = [r for r in records if r.is_me]
-    by_lang  = Counter(r.language_guess for r in my_records)
-    by_year  = Counter(r.year for r in my_records)
-    by_conv  = Counter(r.conversation_title for r in my_records)
-    avg_words = mean(r.word_count for r in my_records) if my_records else 0
+    mine      = aggregates.overall()
+    my_count  = mine.count
+    by_year   = months_per_year(mine.months)
+    by_conv   = Counter({title: s.count for title, s in aggregates.by_conv.items()})
+    avg_words = mine.word_sum / my_count if my_count else 0
 
     print()
     print("┌─────────────────────────────────────────────┐")
     print("│         messenger-personality-extractor      │")
     print("│              Extraction complete             │")
     print("├─────────────────────────────────────────────┤")
-    print(f"│  Total messages (all)   : {len(records):>8,}             │")
-    print(f"│  Subject messages (me)  : {len(my_records):>8,}             │")
+    print(f"│  Total messages (all)   : {aggregates.all_count:>8,}             │")
+    print(f"│  Subject messages (me)  : {my_count:>8,}             │")
     print(f"│  Conversations          : {len(by_conv):>8,}             │")
     print(f"│  Avg words/msg (mine)   : {avg_words:>8.1f}             │")
-    print(f"│  First message          : {my_records[0].timestamp_iso[:10] if my_records else 'n/a'}              │")
-    print(f"│  Last message           : {my_records[-1].timestamp_iso[:10] if my_records else 'n/a'}              │")
+    print(f"│  First message          : {mine.first_message[:10] if my_count else 'n/a'}              │")
+    print(f"│  Last message           : {mine.last_message[:10] if my_count else 'n/a'}              │")
     print("├─────────────────────────────────────────────┤")
     print("│  Language breakdown (my messages):          │")
-    for lang, count in by_lang.most_common():
-        pct = 100 * count / len(my_records) if my_records else 0
+    for lang, count in ranked(mine.languages):
+        pct = 100 * count / my_count if my_count else 0
         print(f"│    {lang:<22} {count:>8,}  ({pct:4.1f}%)   │")
     print("├─────────────────────────────────────────────┤")
     print("│  Top conversations (by my message count):   │")
-    for title, count in by_conv.most_common(5):
+    for title, count in ranked(by_conv, 5):
         title_short = title[:28].ljust(28)
         print(f"│    {title_short} {count:>6,}          │")
     print("├─────────────────────────────────────────────┤")
@@ -664,6 +3681,15 @@ def print_stats(records: List[MessageRecord], output_root: Path) -> None:
     print("  Next step: run build_training_pairs.py to generate fine-tuning data.")
     print()
 
+def save_profile(output_root: Path, started: float, workers: int) -> None:
+    if not PROFILE.enabled:
+        return
+    report = PROFILE.report(time.perf_counter() - started, resolve_workers(workers))
+    with (output_root / PROFILE_NAME).open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_profile(report)
+    print(f"  Profile written to {output_root / PROFILE_NAME}\n")
+
 # ---------------------------------------------------------------------------
 # Entry point
 # ---------------------------------------------------------------------------
@@ -671,61 +3697,186 @@ def print_stats(records: List[MessageRecord], output_root: Path) -> None:
 def main() -> None:
     args = parse_args()
 
-    input_root  = Path(args.input).expanduser().resolve()
+    inputs      = [Path(p).expanduser().resolve() for p in args.input]
     output_root = Path(args.output).expanduser().resolve()
 
-    if not input_root.exists():
-        print(f"[ERROR] Input folder not found: {input_root}", file=sys.stderr)
-        sys.exit(1)
+    for input_root in inputs:
+        if not input_root.exists():
+            print(f"[ERROR] Input folder or archive not found: {input_root}", file=sys.stderr)
+            sys.exit(1)
+
+    temp_dir    = Path(args.temp_dir).expanduser().resolve() if args.temp_dir else None
 
     ensure_dir(output_root)
+    if temp_dir is not None:
+        ensure_dir(temp_dir)
+    started = time.perf_counter()
+    if args.profile:
+        PROFILE.enabled = True
+        tracemalloc.start()
 
     print(f"\nmessenger-personality-extractor v{__version__}")
-    print(f"  Input  : {input_root}")
+    for input_root in inputs:
+        print(f"  Input  : {input_root}{'  (zip)' if is_zip_input(input_root) else ''}")
     print(f"  Output : {output_root}")
     print(f"  Name   : {args.my_name}")
-    print(f"  Groups : {'yes' if args.include_group_chats else 'no'}\n")
+    print(f"  Groups : {'yes' if args.include_group_chats else 'no'}")
+    filters = RecordFilter.create(args.since, args.until, args.conversation, args.participant)
+    if filters.active:
+        shown  = [f"{name} {timestamp_to_dt(ms):%Y-%m-%d %H:%M}"
+                  for name, ms in (("since", args.since), ("until", args.until)) if ms is not None]
+        shown += [f"conversation {glob!r}" for glob in args.conversation]
+        shown += [f"participant {glob!r}" for glob in args.participant]
+        print(f"  Filter : {', '.join(shown)}")
+    print(f"  Workers: {resolve_workers(args.workers)}\n")
+
+    manifest_path = output_root / MANIFEST_NAME
+    options = {
+        "my_name":             args.my_name,
+        "include_group_chats": args.include_group_chats,
+        "min_chars":           args.min_chars,
+    }
+    if filters.active:
+        options["filters"] = filters.to_json()
+    if args.compress:
+        options["compress"] = True
+    if args.columns:
+        options["columns"] = True
+    if args.term_sketch:
+        options["term_sketch"] = args.term_sketch
+    if args.media:
+        options["media"] = True
+    media_refs = MediaSpool(temp_dir) if args.media else None
+    with PROFILE.stage("discovery") as counts:
+        json_files = find_message_files(inputs)
+        counts["items"] = len(json_files)
+    previous   = load_manifest(manifest_path) if args.incremental else None
+    if previous is not None and (previous.get("options") != options
+                                 or "aggregates" not in previous
+                                 or not compact_database(output_root / "messages.sqlite")):
+        print("  Manifest does not match this output folder — running a full extraction.")
+        previous = None
+
+    with PROFILE.stage("manifest") as counts:
+        entries, changed = scan_sources(json_files, previous, resolve_workers(args.workers))
+        counts["items"] = len(json_files)
+
+    if previous is not None:
+        print(f"  Incremental: {len(changed):,} of {len(json_files):,} files new or changed.")
+        records = iter_records(
+            inputs              = inputs,
+            my_name             = args.my_name,
+            include_group_chats = args.include_group_chats,
+            min_chars           = args.min_chars,
+            workers             = args.workers,
+            json_files          = changed,
+            sort_memory_mb      = args.sort_memory,
+            temp_dir            = temp_dir,
+            filters             = filters,
+            media               = media_refs,
+        )
+        aggregates = Aggregates.from_json(previous["aggregates"])
+        manifest_path.unlink()      # rewritten once the outputs are merged
+        total, new = run_incremental(records, output_root, aggregates, fts=args.fts,
+                                     compress=args.compress, columns=args.columns)
+        if media_refs is not None:
+            with PROFILE.stage("media") as counts:
+                counts["items"] = index_media(output_root / "messages.sqlite", media_refs,
+                                              inputs, json_files)
+            media_refs.close()
+        with PROFILE.stage("manifest"):
+            save_manifest(manifest_path, options, entries, aggregates)
+        print(f"  Merged {total:,} records ({new:,} new) into {output_root}")
+        print_stats(aggregates, output_root)
+        save_profile(output_root, started, args.workers)
+        return
+
+    if len(changed) < len(json_files):
+        print(f"  Skipping {len(json_files) - len(changed):,} files identical to ones "
+              f"already read.")
+    aggregates  = Aggregates(args.term_sketch)
+    message_ids = DedupeIndex()
 
-    records = extract_records(
-        input_root          = input_root,
+    records = iter_records(
+        inputs              = inputs,
         my_name             = args.my_name,
         include_group_chats = args.include_group_chats,
         min_chars           = args.min_chars,
+        workers             = args.workers,
+        json_files          = changed,
+        aggregates          = aggregates,
+        sort_memory_mb      = args.sort_memory,
+        temp_dir            = temp_dir,
+        seen                = message_ids,
+        filters             = filters,
+        media               = media_refs,
     )
-
-    if not records:
+    # Every file has been parsed (and the aggregates filled in) by the time
+    # the first record comes out, so the run is checked before any output
+    # is opened and a failed run leaves the previous outputs untouched.
+    first = next(records, None)
+    if first is None:
         print("[ERROR] No messages found.", file=sys.stderr)
+        if filters.active:
+            print("  Check the --since/--until/--conversation/--participant filters.",
+                  file=sys.stderr)
         print("  Check that --my-name matches exactly as it appears in the export.", file=sys.stderr)
         sys.exit(1)
 
-    my_count = sum(1 for r in records if r.is_me)
-    if my_count == 0:
+    if aggregates.my_count == 0:
+        records.close()
         print(f"[ERROR] No messages found for '{args.my_name}'.", file=sys.stderr)
         print("  Check that --my-name matches exactly (case-sensitive).", file=sys.stderr)
         sys.exit(1)
-
-    print(f"  Saving messages.jsonl  ({len(records):,} records)…")
-    save_jsonl(records, output_root / "messages.jsonl")
-
-    print("  Saving messages.csv …")
-    save_csv(records, output_root / "messages.csv")
-
-    print("  Saving messages.sqlite …")
-    save_sqlite(records, output_root / "messages.sqlite")
-
-    print("  Building markdown shards (subject's messages only)…")
-    build_markdown_shards(records, output_root / "markdown_shards")
-
-    print("  Building style profiles (subject's messages only)…")
-    build_style_summaries(records, output_root / "style_profiles.json")
-
-    print("  Saving global summary (subject's messages only)…")
-    save_global_summary(records, output_root / "global_summary.json")
+    records = chain([first], records)
+    # Until this run has written everything, the old manifest no longer
+    # describes the outputs; without it a later --incremental run starts over.
+    manifest_path.unlink(missing_ok=True)
+
+    # The full run replaces messages.sqlite; keep its file hashes for --media.
+    known_media = load_media_files(output_root / "messages.sqlite") if args.media else None
+
+    # Every output consumes the same stream in one pass. Markdown shards and
+    # the aggregates (style profiles, global summary) cover the subject's
+    # messages only; the aggregates are filled in while files are parsed.
+    sinks: List[Sink] = [
+        JsonlSink(output_root / "messages.jsonl", compress=args.compress),
+        CsvSink(output_root / "messages.csv", compress=args.compress),
+        SqliteSink(output_root / "messages.sqlite", fts=args.fts),
+        MarkdownShardSink(output_root / "markdown_shards"),
+    ]
+    if args.columns:
+        sinks.append(ColumnarSink(output_root / COLUMNS_DIR))
+    try:
+        total = run_sinks(records, sinks,
+                          threads=not args.serial_sinks and (os.cpu_count() or 1) > 1)
+    except SinkError as exc:
+        for name, error in exc.failures.items():
+            print(f"[ERROR] Writing {name} failed: {error}", file=sys.stderr)
+        print("  The other outputs were written completely; re-run to rebuild the "
+              "failed one.", file=sys.stderr)
+        sys.exit(1)
+    with PROFILE.stage("dedupe", memory=False):
+        message_ids.save(output_root / DEDUPE_INDEX_NAME)
+    with PROFILE.stage("summaries") as counts:
+        aggregates.save(output_root)
+        counts["items"] = len(aggregates.by_conv)
+    print(f"  Wrote {total:,} records to {', '.join(s.name for s in sinks)}, "
+          f"style_profiles.json, global_summary.json")
+
+    if media_refs is not None:
+        with PROFILE.stage("media") as counts:
+            counts["items"] = index_media(output_root / "messages.sqlite", media_refs,
+                                          inputs, json_files, known_media)
+        media_refs.close()
 
     print("  Saving training instructions…")
     save_training_instructions(output_root / "TRAINING_INSTRUCTIONS.md")
+    with PROFILE.stage("manifest"):
+        save_manifest(manifest_path, options, entries, aggregates)
 
-    print_stats(records, output_root)
+    print_stats(aggregates, output_root)
+    save_profile(output_root, started, args.workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+generate_fake_export.py
+=======================
+Write a synthetic Facebook Messenger JSON export at a chosen scale, for
+testing and benchmarking extract_messenger_personality.py without real data.
+
+The export mimics what Facebook delivers:
+  - one folder per conversation under messages/inbox (plus a few in
+    archived_threads / filtered_threads), message_1.json newest first,
+    split every --messages-per-file messages
+  - the header (title, thread_path, …) written after the messages array
+  - every string in Facebook's latin-1 mojibake, \\u-escaped
+  - 1-on-1 and group chats, Greek / English / mixed text, URLs, emoji
+  - photos, videos, audio, files, gifs, stickers, shares, calls,
+    reactions, unsent messages and a few duplicated messages
+
+Message counts per conversation follow a Zipf-like curve, so a handful of
+conversations dominate, as in real exports. The same --seed always
+produces the same export.
+
+Usage:
+    python generate_fake_export.py --output ./fake_export
+    python generate_fake_export.py --output fake.zip --conversations 400 --messages 1000000
+
+Options:
+    --output PATH          Export folder, or a .zip path to write an archive (required)
+    --conversations N      Number of conversations (default: 100)
+    --messages N           Total number of messages (default: 100000)
+    --group-ratio F        Share of conversations that are group chats (default: 0.2)
+    --my-name NAME         The subject's sender_name (default: "Alex Example")
+    --messages-per-file N  Messages per message_N.json (default: 10000, as Facebook)
+    --seed N               Random seed (default: 42)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+__version__ = "1.0.0"
+
+MY_NAME = "Alex Example"
+
+FIRST_NAMES = ["Μαρία", "Γιώργος", "Ελένη", "Νίκος", "Κατερίνα", "Δημήτρης", "Σοφία",
+               "Κώστας", "Anna", "John", "Emma", "Lucas", "Olivia", "Marco", "Chloé", "Zoë"]
+LAST_NAMES  = ["Παπαδοπούλου", "Οικονόμου", "Γεωργίου", "Νικολάου", "Smith", "Müller",
+               "García", "Rossi", "Dubois", "Novák", "K.", "P."]
+
+WORDS_EN = ("hello there how are you doing today lets meet tomorrow for coffee ok sure "
+            "great thanks see you later did you see the match what time works for you "
+            "running late sorry can't wait haha that is so funny send me the photos "
+            "happy birthday good night talk soon on my way just arrived").split()
+WORDS_GR = ("γεια σου τι κάνεις σήμερα θα βρεθούμε αύριο για καφέ εντάξει ωραία "
+            "ευχαριστώ πολύ τα λέμε αργότερα είδες το ματς τι ώρα σε βολεύει "
+            "έρχομαι σε λίγο συγγνώμη χαχα πολύ αστείο στείλε μου τις φωτογραφίες "
+            "χρόνια πολλά καληνύχτα μιλάμε σύντομα φτάνω ήρθα μόλις").split()
+EMOJI    = ["😂", "❤️", "👍", "😊", "🙏", "🎉", "😅", "🔥"]
+DOMAINS  = ["example.com", "news.example.org", "youtu.be", "maps.example.net"]
+
+FOLDER_WEIGHTS = [("inbox", 0.9), ("archived_threads", 0.07), ("filtered_threads", 0.03)]
+
+# Kinds of message and how often they occur. Text dominates; the rest
+# exercise the attachment counters and the noise filter.
+MESSAGE_KINDS = [
+    ("text", 0.80), ("link", 0.04), ("photos", 0.05), ("videos", 0.01),
+    ("audio", 0.01), ("file", 0.005), ("gif", 0.01), ("sticker", 0.02),
+    ("share", 0.01), ("call", 0.01), ("unsent", 0.015), ("empty", 0.01),
+]
+
+# ---------------------------------------------------------------------------
+# Facebook encoding
+# ---------------------------------------------------------------------------
+
+def mojibake(text: str) -> str:
+    """The utf-8 bytes of text read as latin-1 — how Facebook stores every string."""
+    return text.encode("utf-8").decode("latin-1")
+
+def encode_strings(value: Any) -> Any:
+    if isinstance(value, str):
+        return mojibake(value)
+    if isinstance(value, list):
+        return [encode_strings(v) for v in value]
+    if isinstance(value, dict):
+        return {k: encode_strings(v) for k, v in value.items()}
+    return value
+
+# ---------------------------------------------------------------------------
+# Content
+# ---------------------------------------------------------------------------
+
+def random_name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def random_text(rng: random.Random, language: str) -> str:
+    n = min(60, int(rng.expovariate(1 / 7)) + 1)
+    if language == "greek":
+        words = rng.choices(WORDS_GR, k=n)
+    elif language == "english":
+        words = rng.choices(WORDS_EN, k=n)
+    else:
+        words = rng.choices(WORDS_GR + WORDS_EN, k=n)
+    if rng.random() < 0.1:
+        words[0] = words[0].capitalize()
+    text = " ".join(words)
+    if rng.random() < 0.12:
+        text += " " + rng.choice(EMOJI)
+    if rng.random() < 0.15:
+        text += rng.choice(["!", "?", "...", "!!"])
+    return text
+
+def random_url(rng: random.Random) -> str:
+    return f"https://{rng.choice(DOMAINS)}/{rng.randrange(16**8):08x}"
+
+def media_uri(folder: str, kind: str, ts: int) -> Dict[str, Any]:
+    return {"uri": f"messages/{folder}/{kind}/{kind[:-1]}_{ts}.jpg",
+            "creation_timestamp": ts // 1000}
+
+def make_message(rng: random.Random, sender: str, ts: int, language: str,
+                 folder: str, participants: List[str]) -> Dict[str, Any]:
+    kind = rng.choices([k for k, _ in MESSAGE_KINDS], [w for _, w in MESSAGE_KINDS])[0]
+    msg: Dict[str, Any] = {"sender_name": sender, "timestamp_ms": ts}
+    if kind == "text":
+        msg["content"] = random_text(rng, language)
+    elif kind == "link":
+        msg["content"] = f"{random_text(rng, language)} {random_url(rng)}"
+    elif kind == "photos":
+        msg["photos"] = [media_uri(folder, "photos", ts + i) for i in range(rng.randint(1, 4))]
+    elif kind == "videos":
+        msg["videos"] = [media_uri(folder, "videos", ts)]
+    elif kind == "audio":
+        msg["audio_files"] = [media_uri(folder, "audio", ts)]
+    elif kind == "file":
+        msg["files"] = [media_uri(folder, "files", ts)]
+    elif kind == "gif":
+        msg["gifs"] = [{"uri": f"messages/{folder}/gifs/gif_{ts}.gif"}]
+    elif kind == "sticker":
+        msg["sticker"] = {"uri": f"messages/stickers_used/sticker_{ts % 97}.png"}
+    elif kind == "share":
+        link = random_url(rng)
+        msg["share"]   = {"link": link}
+        msg["content"] = link
+    elif kind == "call":
+        msg["content"]       = f"{sender} called you." if len(participants) == 2 \
+                               else f"{sender} started a call."
+        msg["call_duration"] = rng.choice([0, rng.randint(5, 3600)])
+    elif kind == "unsent":
+        msg["is_unsent"] = True
+    # "empty": a bare message with no content, as Facebook sometimes emits
+    if rng.random() < 0.06:
+        msg["reactions"] = [{"reaction": rng.choice(EMOJI), "actor": rng.choice(participants)}]
+    msg["is_geoblocked_for_viewer"] = False
+    return msg
+
+# ---------------------------------------------------------------------------
+# Conversations
+# ---------------------------------------------------------------------------
+
+def conversation_sizes(rng: random.Random, conversations: int, messages: int) -> List[int]:
+    """Split messages over conversations along a Zipf-like curve, at least 1 each."""
+    weights = [1 / (rank ** 1.1) for rank in range(1, conversations + 1)]
+    rng.shuffle(weights)
+    scale   = max(0, messages - conversations) / sum(weights)
+    sizes   = [1 + int(w * scale) for w in weights]
+    for i in range(messages - sum(sizes)):
+        sizes[i % conversations] += 1
+    return sizes
+
+def conversation_messages(rng: random.Random, count: int, participants: List[str],
+                          folder: str) -> List[Dict[str, Any]]:
+    """count messages in chat sessions over a few years, newest first."""
+    language = rng.choices(["greek", "english", "mixed"], [0.45, 0.4, 0.15])[0]
+    ts       = rng.randint(1_300_000_000_000, 1_650_000_000_000)
+    msgs     = []
+    for _ in range(count):
+        if rng.random() < 0.08:    # a new session, hours to weeks later
+            ts += int(rng.expovariate(1 / (3 * 86_400_000)))
+        else:
+            ts += rng.randint(2_000, 240_000)
+        sender = rng.choice(participants)
+        msg_language = language if rng.random() < 0.8 else rng.choice(["greek", "english", "mixed"])
+        msgs.append(make_message(rng, sender, ts, msg_language, folder, participants))
+    msgs.reverse()
+    return msgs
+
+def conversation_files(rng: random.Random, index: int, count: int, group: bool,
+                       my_name: str, messages_per_file: int,
+                       duplicate_ratio: float = 0.001) -> Dict[str, Dict[str, Any]]:
+    """{relative path: JSON document} for one conversation."""
+    others = sorted({random_name(rng) for _ in range(rng.randint(2, 8) if group else 1)})
+    participants = others + [my_name]
+    if group:
+        title = rng.choice([", ".join(others[:3]), "Οι κολλητοί 🎉", "Weekend trip",
+                            "Family", "Ομάδα εργασίας"])
+    else:
+        title = others[0]
+
+    box    = rng.choices([f for f, _ in FOLDER_WEIGHTS], [w for _, w in FOLDER_WEIGHTS])[0]
+    slug   = "".join(c for c in title.lower() if c.isascii() and c.isalnum())[:20] or "conversation"
+    folder = f"{box}/{slug}_{10_000_000_000 + index * 7919}"
+    msgs   = conversation_messages(rng, count, participants, folder)
+
+    # Facebook occasionally repeats a message at a file boundary.
+    for i in range(messages_per_file, len(msgs), messages_per_file):
+        if rng.random() < 0.5:
+            msgs.insert(i, dict(msgs[i - 1]))
+    for _ in range(int(len(msgs) * duplicate_ratio)):
+        i = rng.randrange(len(msgs))
+        msgs.insert(i, dict(msgs[i]))
+
+    files = {}
+    for n, start in enumerate(range(0, len(msgs), messages_per_file), 1):
+        doc = {
+            "participants":         [{"name": p} for p in participants],
+            "messages":             msgs[start:start + messages_per_file],
+            "title":                title,
+            "is_still_participant": True,
+            "thread_path":          folder,
+            "magic_words":          [],
+        }
+        if group:
+            doc["joinable_mode"] = {"mode": 1, "link": ""}
+        files[f"your_facebook_activity/messages/{folder}/message_{n}.json"] = encode_strings(doc)
+    return files
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def generate_export(
+    output: Path,
+    conversations: int = 100,
+    messages: int = 100_000,
+    group_ratio: float = 0.2,
+    my_name: str = MY_NAME,
+    messages_per_file: int = 10_000,
+    seed: int = 42,
+) -> Dict[str, int]:
+    """
+    Write the export to output (a folder, or an archive if it ends in .zip).
+    Returns {"files", "messages", "bytes"}; messages includes duplicates.
+    """
+    rng     = random.Random(seed)
+    sizes   = conversation_sizes(rng, conversations, messages)
+    archive: Optional[zipfile.ZipFile] = None
+    if output.suffix.lower() == ".zip":
+        output.parent.mkdir(parents=True, exist_ok=True)
+        archive = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED)
+    stats = {"files": 0, "messages": 0, "bytes": 0}
+
+    try:
+        for index, count in enumerate(sizes):
+            group = rng.random() < group_ratio
+            files = conversation_files(rng, index, count, group, my_name, messages_per_file)
+            for rel, doc in files.items():
+                data = json.dumps(doc, indent=2).encode("ascii")
+                if archive is not None:
+                    archive.writestr(rel, data)
+                else:
+                    path = output / rel
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(data)
+                stats["files"]    += 1
+                stats["messages"] += len(doc["messages"])
+                stats["bytes"]    += len(data)
+    finally:
+        if archive is not None:
+            archive.close()
+    return stats
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Generate a synthetic Facebook Messenger JSON export.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    p.add_argument("--output",            required=True, help="Export folder or .zip path")
+    p.add_argument("--conversations",     type=int, default=100,
+                   help="Number of conversations (default: 100)")
+    p.add_argument("--messages",          type=int, default=100_000,
+                   help="Total number of messages (default: 100000)")
+    p.add_argument("--group-ratio",       type=float, default=0.2,
+                   help="Share of group chats (default: 0.2)")
+    p.add_argument("--my-name",           default=MY_NAME,
+                   help=f"The subject's sender_name (default: {MY_NAME!r})")
+    p.add_argument("--messages-per-file", type=int, default=10_000,
+                   help="Messages per message_N.json (default: 10000)")
+    p.add_argument("--seed",              type=int, default=42, help="Random seed (default: 42)")
+    p.add_argument("--version",           action="version", version=f"%(prog)s {__version__}")
+    return p.parse_args()
+
+def main() -> None:
+    args   = parse_args()
+    output = Path(args.output).expanduser().resolve()
+
+    if args.conversations < 1 or args.messages < args.conversations:
+        print("[ERROR] Need at least one conversation and one message per conversation.",
+              file=sys.stderr)
+        sys.exit(1)
+    if output.suffix.lower() != ".zip" and output.exists() and any(output.iterdir()):
+        print(f"[ERROR] Output folder is not empty: {output}", file=sys.stderr)
+        sys.exit(1)
+
+    started = time.perf_counter()
+    stats = generate_export(
+        output            = output,
+        conversations     = args.conversations,
+        messages          = args.messages,
+        group_ratio       = args.group_ratio,
+        my_name           = args.my_name,
+        messages_per_file = args.messages_per_file,
+        seed              = args.seed,
+    )
+    print(f"  Wrote {stats['messages']:,} messages in {stats['files']:,} files "
+          f"({stats['bytes'] / 1e6:,.1f} MB) to {output} "
+          f"in {time.perf_counter() - started:.1f}s")
+    print(f"  Extract with: --my-name \"{args.my_name}\"")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+search_messages.py
+==================
+Full-text search over a messages.sqlite built by
+extract_messenger_personality.py --fts.
+
+Matching ignores case and Greek accents (καφε finds καφέ / ΚΑΦΈ), every word
+must match, and a trailing * searches by prefix (καφ* finds καφές, καφετέρια).
+Hits are ranked by relevance (bm25).
+
+Usage:
+    python search_messages.py --db /path/to/messages.sqlite "καφέ αύριο"
+    python search_messages.py --db messages.sqlite --mine --limit 50 "meet*"
+
+Options:
+    --db              Path to messages.sqlite (required)
+    --limit N         Maximum number of hits (default: 20)
+    --mine            Only the subject's messages (is_me=1)
+    --others          Only other people's messages (is_me=0)
+    --conversation T  Only this conversation title
+    --json            Print hits as JSON lines instead of a table
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from extract_messenger_personality import search_messages
+
+__version__ = "1.0.0"
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Full-text search over a Messenger SQLite dataset.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    p.add_argument("query",          help="Words to search for (trailing * = prefix)")
+    p.add_argument("--db",           required=True, help="Path to messages.sqlite")
+    p.add_argument("--limit",        type=int, default=20,
+                   help="Maximum number of hits (default: 20)")
+    who = p.add_mutually_exclusive_group()
+    who.add_argument("--mine",       action="store_true", help="Only the subject's messages")
+    who.add_argument("--others",     action="store_true", help="Only other people's messages")
+    p.add_argument("--conversation", default=None, help="Only this conversation title")
+    p.add_argument("--json",         action="store_true", help="Print hits as JSON lines")
+    p.add_argument("--version",      action="version", version=f"%(prog)s {__version__}")
+    return p.parse_args()
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    args    = parse_args()
+    db_path = Path(args.db).expanduser().resolve()
+
+    if not db_path.exists():
+        print(f"[ERROR] Database not found: {db_path}", file=sys.stderr)
+        sys.exit(1)
+
+    is_me = True if args.mine else False if args.others else None
+
+    started = time.perf_counter()
+    try:
+        hits = search_messages(db_path, args.query, limit=args.limit,
+                               is_me=is_me, conversation=args.conversation)
+    except RuntimeError as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        sys.exit(1)
+    elapsed_ms = 1000 * (time.perf_counter() - started)
+
+    if args.json:
+        for hit in hits:
+            print(json.dumps(hit, ensure_ascii=False))
+        return
+
+    for hit in hits:
+        who_ = "me" if hit["is_me"] else hit["sender_name"]
+        print(f"  {hit['timestamp_iso'][:16]}  {hit['conversation_title'][:24]:<24}  "
+              f"{who_[:16]:<16}  {hit['text']}")
+    print(f"\n  {len(hits):,} hit(s) in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""--since must not stop reading a file before its message order is known."""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import extract_messenger_personality as emp
+
+BASE_MS  = 1_600_000_000_000
+SINCE_MS = BASE_MS + 20 * 60_000
+
+def write_export(folder: Path, newest_first: bool) -> emp.SourceFile:
+    messages = [{"sender_name": "Alex", "timestamp_ms": BASE_MS + i * 60_000,
+                 "content": f"message number {i}"} for i in range(60)]
+    if newest_first:
+        messages.reverse()
+    path = folder / "inbox" / "friend_1" / "message_1.json"
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({"participants": [{"name": "Alex"}, {"name": "Friend"}],
+                                "title": "Friend", "messages": messages}))
+    return emp.SourceFile(folder, path.relative_to(folder).as_posix())
+
+def parse_since(source: emp.SourceFile) -> list:
+    return emp.parse_message_file(source, "Alex", False, 1,
+                                  emp.RecordFilter.create(since_ms=SINCE_MS))
+
+def test_since_oldest_first(tmp_path: Path) -> None:
+    records = parse_since(write_export(tmp_path, newest_first=False))
+    assert len(records) == 40
+    assert all(rec.timestamp_ms >= SINCE_MS for rec in records)
+
+def test_since_newest_first(tmp_path: Path) -> None:
+    records = parse_since(write_export(tmp_path, newest_first=True))
+    assert len(records) == 40
+    assert all(rec.timestamp_ms >= SINCE_MS for rec in records)